@@ -0,0 +1,79 @@
+# Cache of datasets derived from other data, keyed by the contents of their inputs
+import os, glob, uuid, hashlib, pandas as pd
+from weather import frameFingerprint
+
+MAXENTRIES = 8  # Most artifacts kept under each name, oldest removed first
+ROWGROUPSIZE = (
+    100_000  # Rows written to parquet at once, bounding memory used while writing
+)
+
+
+class ArtifactCache:
+    """
+    Stores derived dataframes as parquet files, named by a hash of everything they were derived from.\n
+    A key is made from input dataframes (by their fingerprint) and parameters, so an artifact is only reused
+    for exactly the inputs it was built from, and is written once however many times it is requested.
+
+    Parameters
+    ----------
+    `path`: Directory in which artifacts are kept\n
+    `maxEntries`: Most artifacts kept under each name
+    """
+
+    def __init__(self, path: str, maxEntries: int = MAXENTRIES):
+        self.path = os.path.abspath(path)
+        self.maxEntries = maxEntries
+
+    @staticmethod
+    def key(*parts) -> str:
+        """
+        Hashes dataframes (by their contents) and parameters (by their repr) into a key.
+        """
+        hasher = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, pd.DataFrame):
+                part = frameFingerprint(part)
+            hasher.update(repr(part).encode("utf-8") + b"\0")
+        return hasher.hexdigest()
+
+    def _artifactPath(self, name: str, key: str) -> str:
+        return os.path.join(self.path, f"{name}-{key}.parquet")
+
+    def load(self, name: str, key: str) -> pd.DataFrame:
+        """Returns the artifact stored under a name and key, or None if there is none."""
+        artifactPath = self._artifactPath(name, key)
+        if not os.path.isfile(artifactPath):
+            return None
+        # Mark the artifact as recently used, so it is the last to be removed
+        os.utime(artifactPath)
+        return pd.read_parquet(artifactPath)
+
+    def _artifactPaths(self, name: str) -> list[str]:
+        # Artifacts of a name, most recently used first
+        return sorted(
+            glob.glob(os.path.join(self.path, f"{name}-*.parquet")),
+            key=os.path.getmtime,
+            reverse=True,
+        )
+
+    def latest(self, name: str) -> pd.DataFrame:
+        """Returns the most recently used artifact stored under a name (whatever its key), or None if there is none."""
+        artifactPaths = self._artifactPaths(name)
+        return pd.read_parquet(artifactPaths[0]) if artifactPaths else None
+
+    def save(self, name: str, key: str, df: pd.DataFrame):
+        """
+        Stores an artifact under a name and key (unless it is already stored), removing the
+        least recently used artifacts of that name beyond maxEntries.
+        """
+        artifactPath = self._artifactPath(name, key)
+        if not os.path.isfile(artifactPath):
+            os.makedirs(self.path, exist_ok=True)
+            temporaryPath = f"{artifactPath}.{uuid.uuid4().hex}"
+            df.to_parquet(temporaryPath, index=False, row_group_size=ROWGROUPSIZE)
+            os.replace(temporaryPath, artifactPath)
+        else:
+            os.utime(artifactPath)
+
+        for stalePath in self._artifactPaths(name)[self.maxEntries :]:
+            os.remove(stalePath)
@@ -0,0 +1,68 @@
+# Benchmarks assembling days of weather data, comparing mergeWeatherTypes with chained merges and per-day concats
+import os, sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from weather.api import mergeWeatherTypes
+from synthetic import weatherFrames
+import pandas as pd
+
+NUMSTATIONS = 5
+DAYCOUNTS = [30, 365]
+
+
+def previousAssemble(days: list) -> pd.DataFrame:
+    """Assembly done by getWeatherRange before mergeWeatherTypes, merging one type at a time."""
+    weatherDf = pd.DataFrame()
+    for weatherData in days:
+        dateDf = weatherData[0]
+        for i in range(1, len(weatherData)):
+            currentType = weatherData[i].columns.tolist()[-1]
+            dateDf = dateDf.merge(
+                weatherData[i][["timestamp", "station-id", currentType]],
+                how="outer",
+                on=["timestamp", "station-id"],
+            )
+        weatherDf = pd.concat(
+            [weatherDf, dateDf.reset_index(drop=True)], ignore_index=True
+        )
+    return weatherDf
+
+
+def assemble(days: list) -> pd.DataFrame:
+    """Assembly done by getWeatherRange, merging all types at once and concatenating days once."""
+    return pd.concat([mergeWeatherTypes(weatherData) for weatherData in days])
+
+
+def sortedReadings(weatherDf: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sorts readings for comparison. Station details are left out, as chained merges
+    only kept them for rows present in the first type.
+    """
+    weatherDf = weatherDf.drop(columns=["station-name", "latitude", "longitude"])
+    return weatherDf.sort_values(by=["station-id", "timestamp"]).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    for dayCount in DAYCOUNTS:
+        start = datetime(2023, 1, 1)
+        days = [
+            weatherFrames(start + timedelta(days=i), NUMSTATIONS)
+            for i in range(dayCount)
+        ]
+
+        timer = perf_counter()
+        previousDf = previousAssemble(days)
+        previousTime = perf_counter() - timer
+        timer = perf_counter()
+        assembledDf = assemble(days)
+        assembleTime = perf_counter() - timer
+        pd.testing.assert_frame_equal(
+            sortedReadings(previousDf), sortedReadings(assembledDf)
+        )
+
+        print(f"{dayCount} days ({assembledDf.shape[0]} rows)")
+        print(f"\tChained merges: {round(previousTime, 2)}s")
+        print(f"\tmergeWeatherTypes: {round(assembleTime, 2)}s")
+        print(f"\tSpeedup: {round(previousTime / assembleTime, 2)}x, results identical")
@@ -0,0 +1,70 @@
+# Checks when responses saved in the weather response cache are reused, expired and evicted
+import os, sys, gzip, json, tempfile
+from datetime import datetime, timedelta
+from time import sleep, time
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from weather.cache import ResponseCache, SGT
+from synthetic import weatherResponse
+
+TTL = 1  # Seconds for which responses fetched during their day are valid
+
+
+def dayEnd(date) -> float:
+    """Returns the time (in seconds since the epoch) at which a day ends in Singapore."""
+    return datetime.combine(
+        date + timedelta(days=1), datetime.min.time(), SGT
+    ).timestamp()
+
+
+if __name__ == "__main__":
+    directory = tempfile.TemporaryDirectory()
+    cache = ResponseCache(directory.name, ttl=TTL)
+    today = datetime.now(SGT).date()
+    yesterday = today - timedelta(days=1)
+    response = weatherResponse(
+        "rainfall", datetime.combine(yesterday, datetime.min.time())
+    )
+
+    # A past day fetched before it ended is partial, so it expires like the current day
+    cache.put("rainfall", yesterday, response, fetched=dayEnd(yesterday) - 14 * 3600)
+    assert cache.get("rainfall", yesterday) is None, "Partial past day was reused"
+    # A past day fetched after it ended is complete, so it is reused however old it is
+    cache.put("rainfall", yesterday, response, fetched=dayEnd(yesterday))
+    assert cache.get("rainfall", yesterday) == response, "Complete day was not reused"
+    print("Past days are only reused once fetched after they ended")
+
+    # Reading the current day does not extend its TTL
+    cache.put("rainfall", today, response)
+    timer = time()
+    while cache.get("rainfall", today) is not None:
+        assert time() - timer < TTL * 2, "Current day did not expire while being read"
+        sleep(TTL / 10)
+    print(
+        f"Current day expired after {round(time() - timer, 2)}s of reads (TTL {TTL}s)"
+    )
+
+    # Responses saved without their fetch time are refetched
+    legacyPath = cache._filePath("wind-speed", yesterday)
+    os.makedirs(os.path.dirname(legacyPath), exist_ok=True)
+    with gzip.open(legacyPath, "wb") as file:
+        file.write(json.dumps(response).encode("utf-8"))
+    assert cache.get("wind-speed", yesterday) is None, "Legacy response was reused"
+    print("Responses saved without a fetch time are refetched")
+
+    # The least recently used response is evicted first, whenever it was fetched
+    cache.clear()
+    days = [yesterday - timedelta(days=i) for i in range(3)]
+    for day in days[:2]:
+        cache.put("rainfall", day, response, fetched=dayEnd(day))
+    cache.get("rainfall", days[0])
+    cache.maxSize = cache.size
+    cache.put("rainfall", days[2], response, fetched=dayEnd(days[2]))
+    assert (
+        cache.get("rainfall", days[1]) is None
+    ), "Least recently used response was kept"
+    assert (
+        cache.get("rainfall", days[0]) == response
+    ), "Recently used response was evicted"
+    print("Least recently used response evicted first")
+    directory.cleanup()
@@ -0,0 +1,56 @@
+# Benchmarks decoding of a day of weather readings, comparing decodeWeather with the previous normalizeWeather path
+import os, sys, json, copy
+from datetime import datetime
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from weather.myutils import decodeWeather, normalizeWeather
+from synthetic import weatherResponse
+import pandas as pd
+
+TYPE = "air-temperature"
+REPEATS = 5
+
+
+def previousDecode(response: dict, type: str) -> pd.DataFrame:
+    """Decoding done by getWeather before decodeWeather, renaming values in every reading."""
+    timedReadings = response["items"]
+    for minute in range(len(timedReadings)):
+        for reading in timedReadings[minute]["readings"]:
+            if not "value" in reading:
+                reading["value"] = None
+            reading[type] = reading.pop("value")
+    return normalizeWeather(timedReadings)
+
+
+def timeDecode(function, response: dict) -> tuple[float, pd.DataFrame]:
+    """Returns the best time taken by a decoder over a number of repeats, and its result."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        # Previous decoder modifies the response, so each repeat gets a fresh copy
+        responseCopy = copy.deepcopy(response)
+        timer = perf_counter()
+        result = function(responseCopy, TYPE)
+        best = min(best, perf_counter() - timer)
+    return best, result
+
+
+if __name__ == "__main__":
+    # Use a recorded response if its path is given, otherwise a synthetic day
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as file:
+            response = json.load(file)
+    else:
+        response = weatherResponse(TYPE, datetime(2023, 10, 1))
+    numReadings = sum(len(item["readings"]) for item in response["items"])
+
+    previousTime, previousDf = timeDecode(previousDecode, response)
+    decodeTime, decodeDf = timeDecode(decodeWeather, response)
+    pd.testing.assert_frame_equal(
+        previousDf, decodeDf, check_dtype=False, check_index_type=False
+    )
+
+    print(f"Readings decoded: {numReadings}")
+    print(f"normalizeWeather: {round(previousTime * 1000, 1)}ms")
+    print(f"decodeWeather: {round(decodeTime * 1000, 1)}ms")
+    print(f"Speedup: {round(previousTime / decodeTime, 2)}x, results identical")
@@ -0,0 +1,77 @@
+# Benchmarks serial against concurrent (and cached) weather fetching, using a local stub of the NEA API
+import os, sys, json, tempfile, threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep, time
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from weather import api
+from synthetic import weatherResponse
+import pandas as pd
+
+LATENCY = (
+    0.5  # Seconds the stub server waits before responding, simulating a round trip
+)
+DAYS = 6
+WORKERS = 10
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Allow keep-alive connections
+    responses = {}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        type = url.path.strip("/")
+        date = parse_qs(url.query)["date"][0]
+        body = self.responses[(type, date)]
+        sleep(LATENCY)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    # Generate responses beforehand so that generation is not timed
+    for date in pd.date_range(datetime(2023, 10, 1), periods=DAYS):
+        for type in api.WEATHER_TYPES:
+            body = json.dumps(weatherResponse(type, date)).encode("utf-8")
+            StubHandler.responses[(type, date.strftime("%Y-%m-%d"))] = body
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api.WEATHER_ENDPOINT = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    # Fetch through the default response cache, kept in a temporary directory and cleared before each cold run
+    cacheDir = tempfile.TemporaryDirectory()
+    api.weatherCache.path = cacheDir.name
+    start, end = datetime(2023, 10, 1), datetime(2023, 10, DAYS)
+    api.weatherCache.clear()
+    timer = time()
+    serialDf = api.getWeatherRange(start, end)
+    serialTime = time() - timer
+    api.weatherCache.clear()
+    timer = time()
+    concurrentDf = api.getWeatherRange(start, end, workers=WORKERS)
+    concurrentTime = time() - timer
+    timer = time()
+    cachedDf = api.getWeatherRange(start, end, workers=WORKERS)
+    cachedTime = time() - timer
+    cacheStats = api.weatherCache.stats()
+    server.shutdown()
+    cacheDir.cleanup()
+
+    pd.testing.assert_frame_equal(serialDf, concurrentDf)
+    pd.testing.assert_frame_equal(serialDf, cachedDf)
+    print(f"\nRequests made: {DAYS * len(api.WEATHER_TYPES)} ({LATENCY}s latency each)")
+    print(f"Serial: {round(serialTime, 2)}s")
+    print(f"Concurrent ({WORKERS} workers): {round(concurrentTime, 2)}s")
+    print(f"Speedup: {round(serialTime / concurrentTime, 2)}x, results identical")
+    print(
+        f"Cached ({cacheStats['hits']} hits): {round(cachedTime, 2)}s, results identical"
+    )
@@ -0,0 +1,100 @@
+# Benchmarks cold start ingest of one payload, comparing the lean ingest path with the previous pandas path
+# Each run is a fresh interpreter, with MongoDB replaced by a stub collection so no network is used
+import os, sys, json, tempfile, subprocess
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from synthetic import floodPayload
+
+NUMSENSORS = 337  # Sensors in one payload from the water level API
+REPEATS = 5
+TARGET = 0.3  # Seconds a cold start of the lean path should take
+
+# Collection accepting writes without a server, defined in each interpreter run
+STUB = """
+class Result:
+    upserted_count = 0
+class Collection:
+    def create_index(self, *args, **kwargs): pass
+    def aggregate(self, *args, **kwargs): return iter([])
+    def bulk_write(self, operations, **kwargs):
+        Result.upserted_count = len(operations)
+        return Result
+    def insert_many(self, documents, **kwargs): return bool(documents)
+class Database:
+    floodData = Collection()
+    def __getitem__(self, name): return self.floodData
+class Client:
+    floodData = Database()
+"""
+
+LEAN = """
+import time
+start = time.perf_counter()
+import ingest, mongo
+imported = time.perf_counter()
+mongo.getClient = lambda: Client
+ingest.ingest(open(PAYLOAD).read())
+"""
+
+# Ingest as done by flooding/__init__.py before the lean path, transposing the frame into dicts
+PREVIOUS = """
+import time
+start = time.perf_counter()
+import requests, pandas as pd
+from pymongo import MongoClient
+from dotenv import load_dotenv, find_dotenv
+from myutils import parseFlooding
+imported = time.perf_counter()
+data = parseFlooding(open(PAYLOAD).read())
+data = data[["timestamp", "sensor-id", "water-level", "status"]]
+documents = list(data.T.to_dict().values())
+Client.floodData.floodData.insert_many(documents)
+"""
+
+REPORT = """
+import json
+print(json.dumps({"imports": imported - start, "work": time.perf_counter() - imported}))
+"""
+
+
+def coldStart(code: str, payloadPath: str) -> dict:
+    """Runs code in a fresh interpreter, returning its wall time and the time spent on imports and on work."""
+    flooding = os.path.abspath(os.path.join(__file__, "../../flooding"))
+    program = f"PAYLOAD = {payloadPath!r}\n{STUB}\n{code}\n{REPORT}"
+    timer = perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", program],
+        cwd=flooding,
+        env={**os.environ, "MONGODB_URI": "mongodb://stub"},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return {"total": perf_counter() - timer, **json.loads(output.splitlines()[-1])}
+
+
+def bestOf(code: str, payloadPath: str) -> dict:
+    """Returns the run with the lowest wall time over a number of repeats."""
+    return min(
+        (coldStart(code, payloadPath) for _ in range(REPEATS)),
+        key=lambda run: run["total"],
+    )
+
+
+if __name__ == "__main__":
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as file:
+        file.write(floodPayload(NUMSENSORS, NUMSENSORS))
+    try:
+        previous = bestOf(PREVIOUS, file.name)
+        lean = bestOf(LEAN, file.name)
+    finally:
+        os.remove(file.name)
+
+    for name, run in [("Previous ingest", previous), ("Lean ingest", lean)]:
+        print(
+            f"{name}: {round(run['total'] * 1000)}ms cold start "
+            f"({round(run['imports'] * 1000)}ms imports, {round(run['work'] * 1000, 1)}ms parse and write)"
+        )
+    print(f"Speedup: {round(previous['total'] / lean['total'], 2)}x")
+    print(f"Under {round(TARGET * 1000)}ms target: {lean['total'] < TARGET}")
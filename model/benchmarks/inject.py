@@ -0,0 +1,61 @@
+# Benchmarks injecting weather data into a large flooding dataset, on one and multiple cores, checking results against weatherAt
+import os, sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from data_gen import injectWeatherData
+from weather import weatherAt, WEATHER_TYPES
+from synthetic import weatherData, floodData
+import numpy as np, pandas as pd
+
+DAYS = 30
+NUMROWS = 1_000_000
+WORKERS = max(os.cpu_count() or 1, 2)
+# Rows checked against weatherAt, which is too slow to run on every row
+NUMCHECKED = 200
+SETTINGS = {
+    "predictionTime": 1,
+    "intervalSize": 0.5,
+    "numReadings": 3,
+    "readingSize": 0.5,
+}
+
+
+if __name__ == "__main__":
+    start = datetime(2023, 11, 1)
+    weatherDf = weatherData(start, DAYS)
+    floodDf = floodData(start, DAYS, NUMROWS)
+
+    timer = perf_counter()
+    injectedDf = injectWeatherData(floodDf, weatherDf, **SETTINGS)
+    injectTime = perf_counter() - timer
+    timer = perf_counter()
+    parallelDf = injectWeatherData(floodDf, weatherDf, **SETTINGS, workers=WORKERS)
+    parallelTime = perf_counter() - timer
+    pd.testing.assert_frame_equal(injectedDf, parallelDf)
+
+    # Check a sample of rows against weatherAt
+    timeShifts = [
+        SETTINGS["predictionTime"] + n * SETTINGS["intervalSize"]
+        for n in range(SETTINGS["numReadings"])
+    ]
+    rng = np.random.default_rng(2)
+    for i in rng.choice(NUMROWS, NUMCHECKED, replace=False):
+        row = injectedDf.iloc[i]
+        for timeShift in timeShifts:
+            expected = weatherAt(
+                row["timestamp"].to_pydatetime() - timedelta(hours=timeShift),
+                weatherDf,
+                interval=round(SETTINGS["readingSize"] * 60),
+                stationId=row["station-id"],
+            )
+            expected = pd.to_numeric(expected[WEATHER_TYPES]).to_numpy()
+            actual = row[[f"{type}-{timeShift}h-prior" for type in WEATHER_TYPES]]
+            assert np.allclose(expected, actual.to_numpy(float), equal_nan=True)
+
+    print(f"Rows injected: {NUMROWS} ({len(timeShifts)} timeshifts)")
+    print(f"injectWeatherData: {round(injectTime, 2)}s")
+    print(f"injectWeatherData ({WORKERS} workers): {round(parallelTime, 2)}s")
+    print(f"Speedup: {round(injectTime / parallelTime, 2)}x, results identical")
+    print(f"{NUMCHECKED} rows match weatherAt")
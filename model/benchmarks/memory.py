@@ -0,0 +1,167 @@
+# Benchmarks peak memory (RSS) of constructDataset on a month of data, against the pipeline before compact types
+import os, sys, subprocess, tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from synthetic import weatherData
+import numpy as np, pandas as pd
+
+DAYS = 30
+INTERVAL = "15min"  # Interval flooding data is saved at by the scheduled workflow
+SETTINGS = {
+    "predictionTime": 1,
+    "intervalSize": 0.5,
+    "numReadings": 3,
+    "readingSize": 0.5,
+}
+MODES = {
+    "previous": "Pipeline before compact types (object ids and names, float64 and int64 readings)",
+    "compact": "Current pipeline (categorical ids, names in side tables, float32 and int8 readings)",
+}
+# Subject of the commit that introduced compact types, whose parent is run as the previous pipeline
+# (set MEMORY_BASELINE to a revision to run instead, if history no longer holds that commit)
+BASELINE = "Use compact column types across the data_gen pipeline"
+TARGET = 4  # Reduction in peak RSS aimed for
+
+
+def monthData(start: datetime) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Creates a month of flooding data for every known sensor and weather data, in the previous types returned by getAllData.
+    """
+    from flooding.myutils import readSensors
+
+    rng = np.random.default_rng(0)
+    sensors = readSensors()
+    times = pd.date_range(start, periods=DAYS * 96, freq=INTERVAL)
+    floodDf = sensors.loc[np.tile(np.arange(len(sensors)), len(times))].reset_index(
+        drop=True
+    )
+    floodDf.insert(0, "timestamp", np.repeat(times, len(sensors)))
+    floodDf["% full"] = rng.uniform(0, 100, len(floodDf)).round(2)
+    floodDf["status"] = rng.integers(0, 3, len(floodDf))
+    weatherDf = weatherData(start, DAYS + 1)
+    return floodDf, weatherDf
+
+
+def baselineRevision(root: str) -> str:
+    """Finds the revision run as the previous pipeline, the parent of the commit titled BASELINE."""
+    if os.environ.get("MEMORY_BASELINE"):
+        return os.environ["MEMORY_BASELINE"]
+    commit = subprocess.run(
+        ["git", "-C", root, "log", "-1", "--format=%H", "-F", f"--grep={BASELINE}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    if not commit:
+        sys.exit(
+            f"No commit titled '{BASELINE}' found, set MEMORY_BASELINE to a revision before compact types"
+        )
+    return f"{commit}^"
+
+
+def memoryMB() -> dict:
+    """Returns the current and peak RSS of this process in MB, read from /proc (so only on Linux)."""
+    with open("/proc/self/status") as file:
+        return {
+            line.split(":")[0]: int(line.split()[1]) / 1024
+            for line in file
+            if line.startswith(("VmRSS", "VmHWM"))
+        }
+
+
+def measure(mode: str, dataDir: str):
+    """
+    Runs constructDataset on the data saved in dataDir, printing the rows produced, the size of the dataset,
+    and the peak RSS while it ran above the RSS before it started (with inputs loaded) in MB.
+    The previous pipeline is run from the baseline's tree, extracted to dataDir/baseline.
+    """
+    if mode == "previous":
+        sys.path.insert(0, os.path.join(dataDir, "baseline", "model"))
+    import data_gen
+    from artifacts import ArtifactCache
+
+    data = [
+        pd.read_parquet(os.path.join(dataDir, f"{name}.parquet"))
+        for name in ["flood", "weather"]
+    ]
+    data_gen.artifacts = ArtifactCache(os.path.join(dataDir, f"artifacts-{mode}"))
+    # The CSV copy of the dataset is not written (the baseline's path to it fails on Linux)
+    pd.DataFrame.to_csv = lambda *args, **kwargs: None
+    if mode == "previous":
+        data_gen.getAllData = lambda dateRange: tuple(data)
+    else:
+        from registry import IdRegistry
+
+        data_gen.DATADIR = dataDir
+        registry = IdRegistry(os.path.join(dataDir, "registry.json"))
+        data_gen.getAllData = lambda dateRange: (
+            data_gen.compact(data[0], data_gen.FLOOD_SCHEMA, registry),
+            data_gen.compact(data[1], data_gen.WEATHER_SCHEMA, registry),
+        )
+
+    # Reset the peak RSS of the process, so the peak of reading inputs is not counted
+    with open("/proc/self/clear_refs", "w") as file:
+        file.write("5")
+    startRSS = memoryMB()["VmRSS"]
+    with open(os.devnull, "w") as devnull:
+        sys.stdout, stdout = devnull, sys.stdout
+        datasetDf = data_gen.constructDataset(**SETTINGS)
+        sys.stdout = stdout
+    datasetMB = datasetDf.memory_usage(deep=True).sum() / 2**20
+    print(len(datasetDf), datasetMB, memoryMB()["VmHWM"] - startRSS)
+
+
+if __name__ == "__main__":
+    # Measure each mode in its own process, so peaks are not shared
+    if len(sys.argv) == 3:
+        measure(*sys.argv[1:])
+        sys.exit()
+
+    from manifest import RangeManifest
+
+    with tempfile.TemporaryDirectory() as dataDir:
+        # Extract the baseline's tree, to run the previous pipeline as it was
+        root = os.path.abspath(os.path.join(__file__, "../../.."))
+        os.makedirs(os.path.join(dataDir, "baseline"))
+        archive = subprocess.run(
+            ["git", "-C", root, "archive", baselineRevision(root), "model"],
+            check=True,
+            capture_output=True,
+        ).stdout
+        subprocess.run(
+            ["tar", "-x", "-C", os.path.join(dataDir, "baseline")],
+            input=archive,
+            check=True,
+        )
+
+        # Both pipelines read the same data, in the types the stores return
+        start = datetime(2023, 11, 1)
+        floodDf, weatherDf = monthData(start)
+        floodDf.to_parquet(os.path.join(dataDir, "flood.parquet"))
+        weatherDf.to_parquet(os.path.join(dataDir, "weather.parquet"))
+        # Mark the month's weather as complete, as it is once those days have ended
+        RangeManifest(os.path.join(dataDir, "manifest.json")).add(
+            "weather",
+            (start - timedelta(days=1)).date(),
+            (start + timedelta(DAYS)).date(),
+        )
+        print(
+            f"{DAYS} days ({floodDf.shape[0]} flooding, {weatherDf.shape[0]} weather rows)"
+        )
+        del floodDf, weatherDf
+
+        peaks = {}
+        for mode, description in MODES.items():
+            output = subprocess.run(
+                [sys.executable, __file__, mode, dataDir],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.split()
+            rows, datasetMB, peaks[mode] = int(output[-3]), *map(float, output[-2:])
+            print(f"\t{description}: {rows} rows produced ({round(datasetMB)}MB)")
+            print(f"\t\tPeak RSS above inputs: {round(peaks[mode])}MB")
+        reduction = peaks["previous"] / peaks["compact"]
+        print(f"\tReduction: {round(reduction, 2)}x")
+        print(f"\tTarget of {TARGET}x: {'met' if reduction >= TARGET else 'not met'}")
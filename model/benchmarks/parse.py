@@ -0,0 +1,61 @@
+# Benchmarks parsing of a flood payload, comparing parseFlooding with its previous quadratic implementation
+import os, sys
+from datetime import datetime
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from flooding.myutils import parseFlooding, parseTimestamp
+from synthetic import floodPayload
+import pandas as pd
+
+NUMRECORDS = 10_000
+REPEATS = 3
+
+
+def previousParse(raw: str) -> pd.DataFrame:
+    """Parsing done by parseFlooding before it was linear, checking each record against all kept records."""
+    dataSplit = [
+        [data for data in sensor.split("$#$")] for sensor in raw.split("$#$$@$")
+    ]
+    data = []
+    for record in dataSplit:
+        if record not in data and len(record) == 7:
+            data.append(
+                {
+                    "timestamp": parseTimestamp.__wrapped__(record[6]),
+                    "sensor-id": record[0],
+                    "sensor-name": record[1],
+                    "latitude": float(record[3]),
+                    "longitude": float(record[2]),
+                    "water-level": float(record[4]),
+                    "status": int(record[5]),
+                }
+            )
+    df = pd.DataFrame(data)
+    return df.sort_values(by=["timestamp", "sensor-id"]).reset_index(drop=True)
+
+
+def timeParse(function, raw: str) -> tuple[float, pd.DataFrame]:
+    """Returns the best time taken by a parser over a number of repeats, and its result."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        parseTimestamp.cache_clear()
+        timer = perf_counter()
+        result = function(raw)
+        best = min(best, perf_counter() - timer)
+    return best, result
+
+
+if __name__ == "__main__":
+    raw = floodPayload(NUMRECORDS)
+    previousTime, previousDf = timeParse(previousParse, raw)
+    parseTime, parseDf = timeParse(parseFlooding, raw)
+
+    # Previous parser compared lists with dicts, so never removed duplicate records
+    previousDf = previousDf.drop_duplicates().reset_index(drop=True)
+    pd.testing.assert_frame_equal(previousDf, parseDf)
+
+    print(f"Records parsed: {NUMRECORDS}, kept: {parseDf.shape[0]}")
+    print(f"Previous parseFlooding: {round(previousTime * 1000, 1)}ms")
+    print(f"parseFlooding: {round(parseTime * 1000, 1)}ms")
+    print(f"Speedup: {round(previousTime / parseTime, 2)}x, results identical")
@@ -0,0 +1,59 @@
+# Checks that the id registry keeps codes stable, when encoding and when several processes register ids at once
+import os, sys, json, tempfile, multiprocessing
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from registry import IdRegistry
+import numpy as np, pandas as pd
+
+PROCESSES = 4
+IDS = 30  # Ids registered by each process, one at a time
+SHARED = "S00"  # Id registered by every process
+
+
+def registerIds(path: str, process: int):
+    """Registers ids of its own and the shared id one at a time, as processes building datasets at once would."""
+    registry = IdRegistry(path)
+    for i in range(IDS):
+        registry.register("stations", [f"P{process}-{i}", SHARED])
+
+
+if __name__ == "__main__":
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, "registry.json")
+
+    # Processes registering at once keep every id, each with its own code
+    processes = [
+        multiprocessing.Process(target=registerIds, args=(path, process))
+        for process in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    with open(path) as file:
+        stations = json.load(file)["stations"]
+    assert len(stations) == PROCESSES * IDS + 1, "Ids registered at once were lost"
+    assert len(set(stations)) == len(stations), "Id registered twice"
+    print(f"{PROCESSES} processes registering at once: {len(stations)} ids kept")
+
+    # Ids are encoded to codes and decoded back, with -1 for missing ids
+    registry = IdRegistry(path)
+    ids = pd.Series(["P0-0", None, "S99", SHARED, "P3-29"])
+    codes = registry.encode("stations", ids)
+    assert codes[1] == -1, "Missing id was given a code"
+    assert (registry.decode("stations", codes) == ids.to_numpy()).all()
+    print("Ids decode to the ids encoded")
+
+    # Codes never change, so ids encoded before more were registered keep their codes
+    before = registry.categorical("stations", ids)
+    registry.register("stations", ["S100"])
+    assert (registry.encode("stations", before) == codes).all()
+    assert (registry.encode("stations", before.astype(object)) == codes).all()
+    assert (registry.categorical("stations", before).codes == codes).all()
+    print("Codes are unchanged once more ids are registered")
+
+    # Another process loading the registry gives the same codes
+    assert (IdRegistry(path).encode("stations", ids) == codes).all()
+    assert np.array_equal(IdRegistry(path).ids("stations"), registry.ids("stations"))
+    print("Codes are the same in a registry loaded again")
+    directory.cleanup()
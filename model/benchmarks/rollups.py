@@ -0,0 +1,116 @@
+# Checks the rollups kept by the SQLite and MongoDB stores against rollups calculated with pandas
+# MongoDB is replaced by mongomock (pip install mongomock), on which $merge is emulated as it is not supported
+import os, sys, tempfile
+import mongomock, mongomock.store
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+import flooding.mongo as mongo
+from flooding import SQLiteFloodStore, MongoFloodStore
+from flooding.migrate import migrateRollups
+from flooding.myutils import parseFlooding, ROLLUPCOLUMNS
+from flooding.records import FIELDS, ROLLUPS, STATUSES
+from synthetic import floodPayload
+
+SENSORS = 10
+HOURS = 30  # Hours of readings, so that daily rollups cover a whole and a partial day
+FREQUENCIES = {"hour": "h", "day": "D"}  # Pandas frequency of each rollup unit
+
+
+def merge(self, pipeline, **kwargs):
+    """Runs an aggregation on mongomock, replacing documents in the collection named by a final $merge stage."""
+    if "$merge" not in pipeline[-1]:
+        return aggregate(self, pipeline, **kwargs)
+    target = self.database[pipeline[-1]["$merge"]["into"]]
+    for document in aggregate(self, pipeline[:-1], **kwargs):
+        target.replace_one({"_id": document["_id"]}, document, upsert=True)
+    return iter([])
+
+
+def expectedRollups(floodDf: pd.DataFrame, unit: str) -> pd.DataFrame:
+    """Calculates rollups of readings over periods of a unit (hour or day) with pandas."""
+    periods = floodDf["timestamp"].dt.floor(FREQUENCIES[unit])
+    statuses = {f"status-{status}": floodDf["status"].eq(status) for status in STATUSES}
+    rollupDf = (
+        floodDf.assign(**statuses)
+        .groupby([periods, "sensor-id"])
+        .agg(
+            **{
+                "readings": ("status", "size"),
+                "mean-water-level": ("water-level", "mean"),
+                "max-water-level": ("water-level", "max"),
+                "min-water-level": ("water-level", "min"),
+            },
+            **{column: (column, "sum") for column in statuses},
+        )
+        .reset_index()
+    )
+    return rollupDf[ROLLUPCOLUMNS]
+
+
+def checkRollups(store, floodDf: pd.DataFrame, name: str):
+    """Checks that a store holds the rollups of floodDf at every resolution."""
+    for resolution, unit in ROLLUPS.items():
+        pd.testing.assert_frame_equal(
+            store.fetchRollups(resolution),
+            expectedRollups(floodDf, unit),
+            check_dtype=False,
+        )
+    print(f"{name}: rollups match pandas at {', '.join(ROLLUPS)}")
+
+
+def checkPeriodStarts(database, name: str):
+    """Checks that rollups keep their period start outside of _id, where their TTL index can expire them."""
+    for resolution in ROLLUPS:
+        rollups = database[f"floodRollups{resolution}"]
+        ttl = [
+            index.get("expireAfterSeconds")
+            for index in rollups.index_information().values()
+            if index["key"] == [("timestamp", 1)]
+        ]
+        assert ttl == [
+            int(mongo.RETENTION.total_seconds())
+        ], "Rollups have no TTL index"
+        assert all(
+            document.get("timestamp") == document["_id"]["timestamp"]
+            for document in rollups.find()
+        ), "Rollup saved without its period start"
+    print(f"{name}: rollups have TTL indexes and period starts")
+
+
+if __name__ == "__main__":
+    floodDf = parseFlooding(floodPayload(SENSORS * 12 * HOURS, SENSORS))[FIELDS]
+    floodDf = floodDf.sort_values(by=["timestamp", "sensor-id"], ignore_index=True)
+    # Save overlapping batches, so periods are recalculated once more readings arrive
+    batches = [floodDf.iloc[: len(floodDf) // 2], floodDf]
+
+    directory = tempfile.TemporaryDirectory()
+    sqliteStore = SQLiteFloodStore(os.path.join(directory.name, "flooding.db"))
+    for batch in batches:
+        sqliteStore.save(batch)
+    checkRollups(sqliteStore, floodDf, "SQLite")
+
+    # Expiring documents on mongomock scans every document on each write, so it is left to the TTL index check below
+    client = mongomock.MongoClient()
+    mongo.MongoClient = lambda uri, **kwargs: client
+    mongomock.store.CollectionStore._remove_expired_documents = lambda self: None
+    aggregate = mongomock.collection.Collection.aggregate
+    mongomock.collection.Collection.aggregate = merge
+    mongoStore = MongoFloodStore()
+    for batch in batches:
+        mongoStore.save(batch)
+    checkRollups(mongoStore, floodDf, "MongoDB")
+
+    # Rollups keep their period start outside of _id, where their TTL index can expire them
+    database = client.floodData
+    checkPeriodStarts(database, "MongoDB")
+
+    # Rollups saved before period starts were kept outside of _id are migrated
+    for resolution in ROLLUPS:
+        database[f"floodRollups{resolution}"].update_many(
+            {}, {"$unset": {"timestamp": ""}}
+        )
+    migrateRollups()
+    checkPeriodStarts(database, "MongoDB after migrating")
+    checkRollups(mongoStore, floodDf, "MongoDB after migrating")
+    directory.cleanup()
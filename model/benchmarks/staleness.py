@@ -0,0 +1,127 @@
+# Checks that a dataset built while a day's weather is still partial is brought up to date once the day is complete
+# Flooding and weather data are synthetic, and the clock is set so that the same days are partial on every run
+import os, sys, tempfile
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from synthetic import weatherData
+from flooding import SQLiteFloodStore
+from flooding.myutils import readSensors
+from artifacts import ArtifactCache
+import data_gen
+import numpy as np, pandas as pd
+
+SENSORS = 40
+START = datetime(2023, 10, 13)  # First day of flooding data
+DAYS = 3
+INTERVAL = "15min"  # Interval flooding data is saved at by the scheduled workflow
+CLOCKS = [
+    datetime(2023, 10, 14, 12, tzinfo=ZoneInfo("Asia/Singapore")),
+    datetime(2023, 10, 15, 12, tzinfo=ZoneInfo("Asia/Singapore")),
+]  # Times the dataset is built at, each halfway through a day
+PROVISIONAL = (
+    5.0  # Rainfall added to readings of the current day, which are revised once it ends
+)
+SETTINGS = {
+    "predictionTime": 1,
+    "intervalSize": 0.5,
+    "numReadings": 3,
+    "readingSize": 0.5,
+}
+KEYS = ["timestamp", "sensor-id"]
+
+
+class Clock(datetime):
+    """Datetime whose current time is set by the check, so data_gen sees the same day as current on every run."""
+
+    current = CLOCKS[0]
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current.astimezone(tz)
+
+
+def floodReadings() -> pd.DataFrame:
+    """Creates flooding readings of the first SENSORS known sensors, over DAYS days from START."""
+    rng = np.random.default_rng(0)
+    sensors = readSensors()["sensor-id"][:SENSORS]
+    times = pd.date_range(START, periods=DAYS * 96, freq=INTERVAL)
+    return pd.DataFrame(
+        {
+            "timestamp": np.repeat(times, len(sensors)),
+            "sensor-id": np.tile(sensors, len(times)),
+            "water-level": rng.uniform(0, 2, len(times) * len(sensors)).round(2),
+            "status": rng.integers(0, 3, len(times) * len(sensors)),
+        }
+    )
+
+
+def weatherRange(allWeatherDf: pd.DataFrame):
+    """
+    Gets a stub of getWeatherRange returning weather recorded so far on the clock,
+    with provisional rainfall for the current day.
+    """
+
+    def getWeatherRange(startDate, endDate=None):
+        now = Clock.current.replace(tzinfo=None)
+        dates = allWeatherDf["timestamp"].dt.date
+        weatherDf = allWeatherDf[
+            (dates >= startDate)
+            & (dates <= (endDate or startDate))
+            & (allWeatherDf["timestamp"] <= now)
+        ].copy()
+        weatherDf.loc[dates == now.date(), "rainfall"] += PROVISIONAL
+        return weatherDf
+
+    return getWeatherRange
+
+
+def build(dataDir: str) -> pd.DataFrame:
+    """Builds the dataset with data_gen keeping its data in dataDir, returning it with ids as strings."""
+    data_gen.DATADIR = dataDir
+    data_gen.artifacts = ArtifactCache(os.path.join(dataDir, "artifacts"))
+    with open(os.devnull, "w") as devnull:
+        sys.stdout, stdout = devnull, sys.stdout
+        datasetDf = data_gen.constructDataset(**SETTINGS)
+        sys.stdout = stdout
+    datasetDf = datasetDf.astype(
+        {column: str for column in datasetDf.select_dtypes("category").columns}
+    )
+    return datasetDf.sort_values(by=KEYS, ignore_index=True)
+
+
+if __name__ == "__main__":
+    directory = tempfile.TemporaryDirectory()
+    floodStore = SQLiteFloodStore(os.path.join(directory.name, "flooding.db"))
+    readingsDf = floodReadings()
+    data_gen.getStore = lambda: floodStore
+    data_gen.getWeatherRange = weatherRange(
+        weatherData(START - timedelta(days=1), DAYS + 1)
+    )
+    data_gen.datetime = Clock
+    pd.DataFrame.to_csv = lambda *args, **kwargs: None
+
+    # Build while the second day is partial, then again once it is complete (saving readings as they arrive)
+    builds = []
+    for clock in CLOCKS:
+        Clock.current = clock
+        floodStore.save(
+            readingsDf[readingsDf["timestamp"] <= clock.replace(tzinfo=None)]
+        )
+        builds.append(build(os.path.join(directory.name, "reused")))
+    firstDf, reusedDf = builds
+    freshDf = build(os.path.join(directory.name, "fresh"))
+
+    # Weather built from the partial day has provisional rainfall, so it must not be reused
+    pd.testing.assert_frame_equal(reusedDf, freshDf, check_dtype=False)
+    revised = firstDf.merge(reusedDf, on=KEYS, suffixes=("", "-reused"))
+    revised = (
+        revised["rainfall-1.0h-prior"] != revised["rainfall-1.0h-prior-reused"]
+    ).sum()
+    print(f"Built at {CLOCKS[0]:%d/%m %H:%M}: {len(firstDf)} rows")
+    print(
+        f"Rebuilt at {CLOCKS[1]:%d/%m %H:%M}: {len(reusedDf)} rows, {revised} rows revised"
+    )
+    print("Rebuilt dataset matches a dataset built from scratch")
+    directory.cleanup()
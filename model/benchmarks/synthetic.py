@@ -0,0 +1,177 @@
+# Synthetic data shaped like the government APIs, for benchmarking without network access
+from datetime import datetime, timedelta
+import random
+
+# Types of weather returned by the NEA API, and the range of values each can take
+WEATHER_RANGES = {
+    "rainfall": (0, 2),
+    "air-temperature": (24, 34),
+    "relative-humidity": (60, 100),
+    "wind-direction": (0, 360),
+    "wind-speed": (0, 10),
+}
+
+
+def stationMetadata(numStations: int = 60) -> list[dict]:
+    """
+    Creates metadata for a number of fake weather stations spread across Singapore.
+    """
+    rng = random.Random(0)
+    return [
+        {
+            "id": f"S{100 + i}",
+            "device_id": f"S{100 + i}",
+            "name": f"Station {i}",
+            "location": {
+                "latitude": round(rng.uniform(1.25, 1.45), 4),
+                "longitude": round(rng.uniform(103.65, 104.0), 4),
+            },
+        }
+        for i in range(numStations)
+    ]
+
+
+def weatherResponse(type: str, date: datetime, numStations: int = 60) -> dict:
+    """
+    Creates a response in the format of the NEA realtime weather API for a given type and date.\n
+    Rainfall is reported every 5 minutes, other types every minute. Some readings are missing values.
+    """
+    rng = random.Random(f"{type}{date:%Y%m%d}")
+    low, high = WEATHER_RANGES[type]
+    stations = stationMetadata(numStations)
+    # Only some stations report each type
+    stations = stations[: int(numStations * 0.8)] if type != "rainfall" else stations
+    step = 5 if type == "rainfall" else 1
+    start = datetime(date.year, date.month, date.day)
+
+    items = []
+    for minute in range(0, 24 * 60, step):
+        readings = []
+        for station in stations:
+            reading = {"station_id": station["id"]}
+            if rng.random() > 0.01:
+                reading["value"] = round(rng.uniform(low, high), 1)
+            readings.append(reading)
+        timestamp = start + timedelta(minutes=minute)
+        items.append(
+            {
+                "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S+08:00"),
+                "readings": readings,
+            }
+        )
+    return {
+        "metadata": {"stations": stations, "reading_type": type},
+        "items": items,
+        "api_info": {"status": "healthy"},
+    }
+
+
+def weatherFrames(date: datetime, numStations: int = 60) -> list:
+    """
+    Creates one dataframe per weather type for a date, in the format returned by getWeather.
+    """
+    import numpy as np, pandas as pd
+
+    rng = np.random.default_rng(int(date.strftime("%Y%m%d")))
+    stations = pd.json_normalize(stationMetadata(numStations))
+    frames = []
+    for type, (low, high) in WEATHER_RANGES.items():
+        step = 5 if type == "rainfall" else 1
+        times = pd.date_range(
+            date, periods=24 * 60 // step, freq=f"{step}min", tz="+08:00"
+        )
+        typeStations = (
+            stations if type == "rainfall" else stations[: int(numStations * 0.8)]
+        )
+        frames.append(
+            pd.DataFrame(
+                {
+                    "timestamp": np.repeat(times, len(typeStations)),
+                    "station-id": np.tile(typeStations["id"], len(times)),
+                    "station-name": np.tile(typeStations["name"], len(times)),
+                    "latitude": np.tile(typeStations["location.latitude"], len(times)),
+                    "longitude": np.tile(
+                        typeStations["location.longitude"], len(times)
+                    ),
+                    type: rng.uniform(low, high, len(times) * len(typeStations)),
+                }
+            )
+        )
+    return frames
+
+
+def weatherData(start: datetime, days: int, numStations: int = 60):
+    """
+    Creates weather data at 5 minute intervals over a number of days, in the format returned by getAllData.
+    """
+    import numpy as np, pandas as pd
+
+    rng = np.random.default_rng(0)
+    stations = pd.json_normalize(stationMetadata(numStations))
+    times = pd.date_range(start, periods=days * 24 * 12, freq="5min")
+    weatherDf = pd.DataFrame(
+        {
+            "station-id": np.repeat(stations["id"], len(times)),
+            "station-name": np.repeat(stations["name"], len(times)),
+            "timestamp": np.tile(times, numStations),
+            "latitude": np.repeat(stations["location.latitude"], len(times)),
+            "longitude": np.repeat(stations["location.longitude"], len(times)),
+        }
+    )
+    for type, (low, high) in WEATHER_RANGES.items():
+        weatherDf[type] = rng.uniform(low, high, weatherDf.shape[0])
+    # Stations go offline at times
+    return weatherDf[rng.random(weatherDf.shape[0]) > 0.05].reset_index(drop=True)
+
+
+def floodData(start: datetime, days: int, numRows: int, numStations: int = 60):
+    """
+    Creates flood data with closest stations already matched, in the format returned by calculateClosestStation.
+    """
+    import numpy as np, pandas as pd
+
+    rng = np.random.default_rng(1)
+    stations = [station["id"] for station in stationMetadata(numStations)]
+    minutes = rng.integers(0, days * 24 * 60, numRows)
+    return pd.DataFrame(
+        {
+            "timestamp": pd.Timestamp(start) + pd.to_timedelta(minutes, unit="min"),
+            "sensor-id": rng.choice([f"EWS{i}" for i in range(300)], numRows),
+            "station-id": rng.choice(stations, numRows),
+            "% full": rng.uniform(0, 100, numRows).round(2),
+            "status": rng.integers(0, 3, numRows),
+        }
+    )
+
+
+def floodPayload(numRecords: int, numSensors: int = 300) -> str:
+    """
+    Creates a raw payload in the format of the PUB water level API, with sensors reporting every 5 minutes.\n
+    Timestamps are padded as the API pads them, and some records are repeated or malformed.
+    """
+    rng = random.Random(2)
+    sensors = [
+        (
+            f"EWS{i}",
+            f"Drain {i}",
+            round(rng.uniform(103.65, 104.0), 6),
+            round(rng.uniform(1.25, 1.45), 6),
+        )
+        for i in range(numSensors)
+    ]
+    start = datetime(2023, 10, 1)
+    records = []
+    for i in range(numRecords):
+        sensorId, name, longitude, latitude = sensors[i % numSensors]
+        time = start + timedelta(minutes=5 * (i // numSensors))
+        timestamp = (
+            f"{time:%b} {time.day:>2} {time:%Y}  {time.strftime('%I:%M%p').lstrip('0')}"
+        )
+        level = round(rng.uniform(0, 100), 2)
+        record = [sensorId, name, str(longitude), str(latitude), str(level)]
+        records.append("$#$".join(record + [str(rng.randint(0, 3)), timestamp]))
+        if rng.random() < 0.05:
+            records.append(records[-1])
+        elif rng.random() < 0.01:
+            records.append(f"{sensorId}$#${name}")
+    return "$#$$@$".join(records)
@@ -1,16 +1,54 @@
 from colorama import Back, Style
-from weather import getWeatherRange, weatherAt
-from flooding import fetchFromDatabase
+from weather import getWeatherRange, WeatherStore, WeatherGrid, GridPool, WEATHER_TYPES
+from flooding import getStore, addSensorDetails, SQLiteFloodStore, RETENTION
+from manifest import RangeManifest
+from artifacts import ArtifactCache
+from registry import IdRegistry
+from schema import (
+    FLOOD_SCHEMA,
+    WEATHER_SCHEMA,
+    compact,
+    splitNames,
+    lookupNames,
+    positions,
+)
 from time import time
-from datetime import datetime, timedelta
-from geopy.distance import geodesic
-import os, joblib, pandas as pd
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from spatial import (
+    StationIndex,
+    StationAvailability,
+    WeightedStations,
+    closestAvailableStations,
+)
+import os, joblib, numpy as np, pandas as pd
 
 
 # Import AI related modules
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.model_selection import train_test_split
 
+# Directory in which data is memoized
+DATADIR = os.path.abspath(os.path.join(__file__, "../data"))
+# Columns of datasets produced by constructDataset, before weather columns
+DATASET_COLUMNS = [
+    "timestamp",
+    "sensor-id",
+    "sensor-name",
+    "sensor-latitude",
+    "sensor-longitude",
+    "station-id",
+    "station-name",
+    "station-latitude",
+    "station-longitude",
+    "station-distance",
+    "% full",
+    "status",
+]
+# Derived datasets, keyed by the contents of their inputs
+artifacts = ArtifactCache(os.path.join(DATADIR, "artifacts"))
+
 
 def log(
     color: str, foreText: str = "", bodyText: str = "", start: str = "", end: str = "\n"
@@ -27,100 +65,82 @@ def getAllData(dateRange: list = None):
     """
     Fetches all flooding and relevant weather data and memoizes
     it in a data folder in the same directory as the current file.\n\n
-    Returns a floodDf and weatherDf
+    Returns a floodDf and weatherDf\n
+    Flooding data is read from the store set by FLOOD_STORE (see flooding.getStore),
+    so setting it to sqlite reads a local mirror without network access.\n
+    Days already cached are recorded in a manifest, so only days missing from the cache are fetched,
+    and only the days requested are loaded. Without a dateRange, all retained data up to today is used.
+    Weather is only fetched for the days covered by the flooding data loaded (and the day before).
     """
-    # TODO: Make sure only the required flooding data for a given date range is fetched
-    # Check if flooding data exists, generate it if otherwise
-    floodDataPath = os.path.join(__file__, "../data/floodData.csv")
-    # Load data if it does not exist
-    if not os.path.isfile(floodDataPath):
-        if dateRange:
-            floodDf = fetchFromDatabase(
-                query={
-                    "status": {"$in": [0, 1, 2]},
-                    "timestamp": {
-                        "$gte": dateRange[0],
-                        "$lte": dateRange[1] + " 23:59:59",
-                    },
-                }
-            )
-        else:
-            floodDf = fetchFromDatabase(
-                query={
-                    "status": {"$in": [0, 1, 2]},
-                }
-            )
-        floodDf.to_csv(floodDataPath, index=False)
-    # Check if existing dataset falls within date range
-    elif dateRange:
-        # Get the start and end dates
-        floodDf = pd.read_csv(floodDataPath)
-        floodDf["timestamp"] = pd.to_datetime(floodDf["timestamp"])
-        dataStartDate = floodDf["timestamp"].min()
-        dataEndDate = floodDf["timestamp"].max()
-
-        # Convert provided date range strings to datetime
-        providedStartDate = pd.to_datetime(dateRange[0] + "T00:00:00")
-        providedEndDate = pd.to_datetime(dateRange[1] + "T23:59:59")
-
-        # Check if data's start and end dates fall within the provided date range
-        startDateWithinRange = providedStartDate <= dataStartDate <= providedEndDate
-        endDateWithinRange = providedStartDate <= dataEndDate <= providedEndDate
-
-        if not (startDateWithinRange and endDateWithinRange):
-            addedData = fetchFromDatabase(
-                query={
-                    "status": {"$in": [0, 1, 2]},
-                    "timestamp": {"$gte": dateRange[0], "$lte": dateRange[1]},
-                }
-            )
-            floodDf = pd.concat([floodDf, addedData]).drop_duplicates(
-                subset=["timestamp", "sensor-id"], keep="first"
+    # Work out the days required (today is never complete, so it is always fetched again)
+    today = datetime.now(ZoneInfo("Asia/Singapore")).date()
+    startDate = date.fromisoformat(dateRange[0]) if dateRange else today - RETENTION
+    endDate = (
+        date.fromisoformat(dateRange[1]) if dateRange and len(dateRange) > 1 else today
+    )
+    lastCompleteDate = min(endDate, today - timedelta(days=1))
+    manifest = RangeManifest(os.path.join(DATADIR, "manifest.json"))
+
+    # Cache flooding data for missing days locally, unless the store is already local
+    floodStore = getStore()
+    if isinstance(floodStore, SQLiteFloodStore):
+        floodCache = floodStore
+    else:
+        floodCache = SQLiteFloodStore(os.path.join(DATADIR, "floodCache.db"))
+        for missingStart, missingEnd in manifest.missing(
+            "flooding", startDate, endDate
+        ):
+            floodCache.save(
+                floodStore.fetchRange(
+                    datetime.combine(missingStart, datetime.min.time()),
+                    datetime.combine(
+                        missingEnd + timedelta(days=1), datetime.min.time()
+                    ),
+                    statuses=[0, 1, 2],
+                )
             )
-            floodDf.to_csv(floodDataPath, index=False)
-
-    # Load memoized flooding data
-    floodDf = pd.read_csv(floodDataPath)
-
-    # Check if weather data is suitable for flood data
-    weatherDataPath = os.path.join(__file__, "../data/weatherData.csv")
-    floodMin = datetime.fromisoformat(floodDf["timestamp"].min()).date()
-    floodMax = datetime.fromisoformat(floodDf["timestamp"].max()).date()
-
-    # Generate data if it doesn't exist
-    if not os.path.isfile(weatherDataPath):
-        weatherDf = getWeatherRange(floodMin - timedelta(days=1), floodMax)
-        weatherDf.to_csv(weatherDataPath, index=False)
-        weatherDf = pd.read_csv(weatherDataPath)
-    # Define conditions on which to add more dates
+            manifest.add("flooding", missingStart, min(missingEnd, lastCompleteDate))
+    floodDf = addSensorDetails(
+        floodCache.fetchRange(
+            datetime.combine(startDate, datetime.min.time()),
+            datetime.combine(endDate + timedelta(days=1), datetime.min.time()),
+            statuses=[0, 1, 2],
+        )
+    )
+
+    # Move weather data saved by earlier versions into the store
+    weatherStore = WeatherStore(os.path.join(DATADIR, "weather"))
+    legacyPath = os.path.join(DATADIR, "weatherData.csv")
+    if os.path.isfile(legacyPath) and not weatherStore.dates():
+        weatherStore.write(pd.read_csv(legacyPath))
+    # Days stored before the manifest existed are complete, except the latest (which may be partial)
+    if "weather" not in manifest:
+        for storedDate in sorted(weatherStore.dates())[:-1]:
+            manifest.add("weather", storedDate, min(storedDate, lastCompleteDate))
+
+    # Fetch and store only weather for missing days, from the day before the flooding data loaded to its last day
+    if floodDf.empty:
+        weatherStart, weatherEnd = startDate, startDate - timedelta(days=1)
     else:
-        weatherDf = pd.read_csv(weatherDataPath)
-        weatherMin = datetime.fromisoformat(weatherDf["timestamp"].min()[:-6]).date()
-        weatherMax = datetime.fromisoformat(weatherDf["timestamp"].max()[:-6]).date()
-        prependDates = weatherMin + timedelta(days=1) > floodMin
-        appendDates = weatherMax < floodMax
-
-        # Prepend missing early dates
-        if prependDates:
-            prependDf = getWeatherRange(floodMin - timedelta(days=1), weatherMin)
-            weatherDf = pd.concat([prependDf, weatherDf])
-
-        # Append missing end dates
-        if appendDates:
-            appendDf = getWeatherRange(weatherMax + timedelta(days=1), floodMax)
-            weatherDf = pd.concat([weatherDf, appendDf])
-
-        # Update csv file
-        if appendDates or prependDates:
-            weatherDf.drop_duplicates().to_csv(weatherDataPath, index=False)
-
-    # Fix typings for dataframes
-    weatherDf["timestamp"] = weatherDf["timestamp"].str[:-6]
-    weatherDf["timestamp"] = pd.to_datetime(weatherDf["timestamp"])
-    floodDf["timestamp"] = pd.to_datetime(floodDf["timestamp"])
+        weatherStart = floodDf["timestamp"].min().date() - timedelta(days=1)
+        weatherEnd = floodDf["timestamp"].max().date()
+    for missingStart, missingEnd in manifest.missing(
+        "weather", weatherStart, weatherEnd
+    ):
+        weatherStore.write(getWeatherRange(missingStart, missingEnd), replace=True)
+        manifest.add("weather", missingStart, min(missingEnd, lastCompleteDate))
+    weatherDf = weatherStore.read(weatherStart, weatherEnd)
+
+    # Fix typings for dataframes (weather timestamps are kept in local time)
+    weatherDf["timestamp"] = weatherDf["timestamp"].dt.tz_localize(None)
     # Cut out all rows with nils
     weatherDf.dropna(inplace=True)
-    return floodDf, weatherDf
+    # Encode sensor and station ids with their registered codes
+    registry = IdRegistry(os.path.join(DATADIR, "registry.json"))
+    return (
+        compact(floodDf, FLOOD_SCHEMA, registry),
+        compact(weatherDf, WEATHER_SCHEMA, registry),
+    )
 
 
 def calculateClosestStation(
@@ -128,112 +148,82 @@ def calculateClosestStation(
 ) -> pd.DataFrame:
     """
     Injects information about the closest weather station into floodDf\n
-    and memoizes it in a data folder in the same directory as the current file.
+    and memoizes it in a data folder in the same directory as the current file,
+    keyed by the contents of floodDf and weatherDf.
     """
 
-    # Check if file exists
-    memoDataPath = os.path.join(__file__, "../data/floodDataWithStations.csv")
-    if os.path.isfile(memoDataPath):
-        # Check if file is valid (number of rows equal)
-        memoDf = pd.read_csv(memoDataPath)
-        if memoDf.shape[0] == floodDf.shape[0]:
-            return memoDf
+    # Reuse stations matched for exactly the same flood and weather data
+    key = ArtifactCache.key(floodDf, weatherDf)
+    memoDf = artifacts.load("floodDataWithStations", key)
+    if memoDf is not None:
+        return memoDf
 
-    # Quickly match sensors to stations
+    # Get details of sensors and stations
     sensors = floodDf.drop_duplicates(subset="sensor-id", keep="first")[
-        ["sensor-id", "sensor-name", "latitude", "longitude"]
-    ]
+        ["sensor-id", "latitude", "longitude"]
+    ].reset_index(drop=True)
     stations = weatherDf.drop_duplicates(subset="station-id", keep="first")[
-        ["timestamp", "station-id", "station-name", "latitude", "longitude"]
-    ]
-
-    # Calculate distance by comparing rows in dataframes
-    def calcDistance(row):
-        sensorCoords = (row["latitude"], row["longitude"])
-        distances = [
-            geodesic(
-                sensorCoords, (station["latitude"], station["longitude"])
-            ).kilometers
-            for _, station in stations.iterrows()
-        ]
-        closestStation = stations.iloc[distances.index(min(distances))]
-        return pd.Series(
-            {
-                "station-distance": min(distances),
-                "station-id": closestStation["station-id"],
-                "station-name": closestStation["station-name"],
-                "station-latitude": closestStation["latitude"],
-                "station-longitude": closestStation["longitude"],
-                "station-first-timestamp": closestStation["timestamp"],
-            }
-        )
+        ["station-id", "latitude", "longitude"]
+    ].reset_index(drop=True)
 
-    # Apply distance calculation function and filter columns (only keep sensor id and station details)
-    sensors = pd.concat([sensors, sensors.apply(calcDistance, axis=1)], axis=1)
-    col = sensors.columns.tolist()
-    sensors = sensors[col[:1] + col[4:]]
-    # Merge stations onto flooding data
-    floodDf = floodDf.merge(right=sensors, on="sensor-id")
-
-    # TODO: Account for stations having gaps in their recording periods
-    # Function handling error values (timestamp of flooding before first timestamp of station)
-    # through iteration of flooding data
-    def calcDistanceManual(row):
-        sensorCoords = (row["latitude"], row["longitude"])
-        availStations = stations[stations["timestamp"] <= row["timestamp"]]
-        distances = [
-            geodesic(
-                sensorCoords, (station["latitude"], station["longitude"])
-            ).kilometers
-            for _, station in availStations.iterrows()
-        ]
-        closestStation = availStations.iloc[distances.index(min(distances))]
-        return pd.Series(
-            {
-                "station-distance": min(distances),
-                "station-id": closestStation["station-id"],
-                "station-name": closestStation["station-name"],
-                "station-latitude": closestStation["latitude"],
-                "station-longitude": closestStation["longitude"],
-                "station-first-timestamp": closestStation["timestamp"],
-            }
-        )
+    # Rank all stations by distance from each sensor, and index when each station was recording
+    stationIndex = StationIndex(stations["latitude"], stations["longitude"])
+    _, rankings = stationIndex.nearest(
+        sensors["latitude"], sensors["longitude"], k=stations.shape[0], exact=1
+    )
+    availability = StationAvailability(weatherDf, stations["station-id"])
 
-    # Get all rows with error values and fix errors
-    errorDf = floodDf[floodDf["timestamp"] < floodDf["station-first-timestamp"]]
-    cols = errorDf.columns.tolist()
-    errorDf = errorDf[cols[:-6]]
-    errorDf = pd.concat([errorDf, errorDf.apply(calcDistanceManual, axis=1)], axis=1)
-    # Update the original dataset with the corrected values and clean df
-    floodDf.update(errorDf)
-    floodDf = (
-        floodDf.rename(
-            {"latitude": "sensor-latitude", "longitude": "sensor-longitude"}, axis=1
+    # Match each row to the closest station recording at the time (once per sensor and hour)
+    sensorCodes = positions(floodDf["sensor-id"], sensors["sensor-id"])
+    ranks = closestAvailableStations(
+        sensorCodes, floodDf["timestamp"], rankings, availability
+    )
+    found = ranks >= 0
+    stationCodes = rankings[sensorCodes, np.maximum(ranks, 0)]
+    closestStation = {
+        "station-id": stations["station-id"].array.take(
+            np.where(found, stationCodes, -1), allow_fill=True
         )
-        .sort_values(by="timestamp", ascending=True)
-        .reset_index(drop=True)
+    }
+    for column in ["latitude", "longitude"]:
+        closestStation[column] = stations[column].to_numpy()[stationCodes]
+        closestStation[column][~found] = np.nan
+
+    # Measure the geodesic distance of each (sensor, station) pair matched once, as ranks past the first are haversine
+    pairCodes, pairIndex = np.unique(
+        sensorCodes[found] * stations.shape[0] + stationCodes[found],
+        return_inverse=True,
     )
-    # Set columns required
-    floodDf = floodDf[
-        [
-            "timestamp",
-            "sensor-id",
-            "sensor-name",
-            "sensor-latitude",
-            "sensor-longitude",
-            "station-id",
-            "station-name",
-            "station-latitude",
-            "station-longitude",
-            "station-distance",
-            "% full",
-            "status",
-        ]
-    ]
+    pairSensors, pairStations = np.divmod(pairCodes, stations.shape[0])
+    stationDistances = np.full(len(found), np.nan, dtype=np.float32)
+    stationDistances[found] = stationIndex.distances(
+        sensors["latitude"].to_numpy()[pairSensors],
+        sensors["longitude"].to_numpy()[pairSensors],
+        pairStations,
+    )[pairIndex]
+
+    # Build the columns required in one step, rather than copying floodDf at each step
+    # (without consolidating them into blocks, which would copy them again)
+    floodDf = pd.DataFrame(
+        {
+            "timestamp": floodDf["timestamp"].to_numpy(),
+            "sensor-id": floodDf["sensor-id"].array,
+            "sensor-latitude": floodDf["latitude"].to_numpy(),
+            "sensor-longitude": floodDf["longitude"].to_numpy(),
+            "station-id": closestStation["station-id"],
+            "station-latitude": closestStation["latitude"],
+            "station-longitude": closestStation["longitude"],
+            "station-distance": stationDistances,
+            "% full": floodDf["% full"].to_numpy(),
+            "status": floodDf["status"].to_numpy(),
+        },
+        copy=False,
+    )
+    if not floodDf["timestamp"].is_monotonic_increasing:
+        floodDf = floodDf.sort_values(by="timestamp", kind="stable", ignore_index=True)
 
     # Save and memoize the dataframe
-    floodDf.to_csv(memoDataPath, index=False)
-    floodDf = pd.read_csv(memoDataPath)
+    artifacts.save("floodDataWithStations", key, floodDf)
     return floodDf
 
 
@@ -244,6 +234,8 @@ def injectWeatherData(
     intervalSize: int,
     numReadings: int,
     readingSize: int,
+    workers: int = None,
+    interpolation: WeightedStations = None,
 ) -> pd.DataFrame:
     """
     Injects approppriate weather data into floodDf based on some parameters
@@ -254,6 +246,8 @@ def injectWeatherData(
     `intervalSize`: Length of interval (in hours) between each moment in time where weather is measured\n
     `numreadings`: Number of moments in time where weather is measured (prior to prediction time)\n
     `readingSize`: Size of period around reading time (in hours), taken to be reading for that time\n
+    `workers`: Number of processes to calculate weather with, when not interpolating [optional]\n
+    `interpolation`: Weights to interpolate weather at each sensor from multiple stations, instead of using the row's station [optional]\n
     """
 
     # Set up timer
@@ -264,96 +258,88 @@ def injectWeatherData(
     )
     startTime = time()
 
-    # Function to generate weather columns for a particular time shift (iterates through df)
-    def addWeatherSet(row, timeShift):
-        # Log progress every 5000 rows
-        if (row.name + 1) % 5000 == 0:
-            log(
-                Back.WHITE,
-                "[UPDATE]",
-                f"Completed {row.name+1}/{fillerDf.shape[0]} rows ({round(time()-startTime)}s)",
-            )
-
-        # Set timestamp at which weather is measured ()
-        try:
-            timestamp = row["timestamp"].to_pydatetime()
-        except:
-            timestamp = datetime.fromisoformat(row["timestamp"].replace(" ", "T"))
-
-        # Calculate weather for given timeshift
-        weatherSeries = weatherAt(
-            timestamp - timedelta(hours=timeShift),
-            weatherDf,
-            interval=round(readingSize * 60),
-            stationId=row["station-id"],
-        )
-
-        # Rename the resultant weather
-        weatherSeries = weatherSeries[
-            [
-                "rainfall",
-                "air-temperature",
-                "relative-humidity",
-                "wind-direction",
-                "wind-speed",
-            ]
-        ]
-        weatherSeries.index = weatherSeries.index.map(
-            lambda x: x + f"-{timeShift}h-prior"
-        )
-        return weatherSeries
+    # Lay out weather data for fast lookups, and get arrays of the keys to look up
+    grid = WeatherGrid.fromFrame(weatherDf)
+    timestamps = pd.to_datetime(floodDf["timestamp"])
+    stationIds = floodDf["station-id"].array
+    sensorIds = floodDf["sensor-id"].array
+    interval = round(readingSize * 60)
+
+    # Query weather from a pool of processes if multiple workers are used, otherwise query the grid directly
+    # (interpolated weather is always calculated in this process, so no pool is started for it)
+    if workers and workers > 1 and not interpolation:
+        pool = GridPool(grid, workers)
+    else:
+        pool = nullcontext(grid)
+    newColumns = {}
+    with pool as lookup:
+        # Iterate through timeshifts
+        timeShifts = [predictionTime + n * intervalSize for n in range(numReadings)]
+        for timeShift in timeShifts:
+            columns = [f"{type}-{timeShift}h-prior" for type in WEATHER_TYPES]
+            # Filter rows to fill based on existence of the columns
+            testColumn = columns[0]
+            if testColumn in floodDf.columns:
+                # Filter only nan rows to fill
+                fillMask = floodDf[testColumn].isna().to_numpy()
+            else:
+                # Else use entire dataset
+                fillMask = np.ones(floodDf.shape[0], dtype=bool)
+
+            # Check for and logs whether to continue
+            if not fillMask.any():
+                log(
+                    Back.GREEN,
+                    "[FETCH]",
+                    f"No updates for timeshift of -{timeShift}h",
+                )
+                continue
+            else:
+                log(
+                    Back.GREEN,
+                    "[FETCH]",
+                    f"Weather for timeshift of -{timeShift}h ({fillMask.sum()} rows)",
+                )
+
+            # Calculate weather for all rows at once
+            # (rows are only selected when some are left out, as selecting copies them)
+            times = (timestamps - pd.Timedelta(hours=timeShift)).to_numpy()
+            rows = slice(None) if fillMask.all() else fillMask
+            if interpolation:
+                weather = interpolation.query(
+                    grid, sensorIds[rows], times[rows], interval, dtype=np.float32
+                )
+            else:
+                weather = lookup.query(
+                    stationIds[rows], times[rows], interval, dtype=np.float32
+                )
+            del times
+
+            # Update flood dataframe if columns required are already present (keeping existing values where weather is missing)
+            if testColumn in floodDf.columns:
+                existing = floodDf.loc[fillMask, columns].to_numpy(dtype=np.float32)
+                floodDf.loc[fillMask, columns] = np.where(
+                    np.isnan(weather), existing, weather
+                )
+            # Collect columns required if not present (each in its own array), to add to floodDf all at once
+            else:
+                for i, column in enumerate(columns):
+                    newColumns[column] = np.ascontiguousarray(weather[:, i])
+            del weather
 
-    # Iterate through timeshifts
-    timeShifts = [predictionTime + n * intervalSize for n in range(numReadings)]
-    for timeShift in timeShifts:
-        # Filter rows to fill based on existence of the columns
-        testColumn = f"rainfall-{timeShift}h-prior"
-        if testColumn in floodDf.columns:
-            # Filter only nan rows to fill
-            fillerDf = floodDf[pd.isnull(floodDf[testColumn])].reset_index(drop=True)
-        else:
-            # Else use entire dataset
-            fillerDf = floodDf.copy(deep=True)
-
-        # Check for and logs whether to continue
-        if fillerDf.shape[0] == 0:
-            log(
-                Back.GREEN,
-                "[FETCH]",
-                f"No updates for timeshift of -{timeShift}h",
-            )
-            continue
-        else:
             log(
                 Back.GREEN,
-                "[FETCH]",
-                f"Weather for timeshift of -{timeShift}h ({fillerDf.shape[0]} rows)",
-            )
-
-        # Filter essential info necessary for filling weather data
-        fillerDf = fillerDf[["timestamp", "sensor-id", "station-id"]]
-
-        # Insert weather data based on time shift
-        newColumns = fillerDf.apply(addWeatherSet, axis=1, timeShift=timeShift)
-        fillerDf = pd.concat([fillerDf, newColumns], axis=1)
-
-        # Update flood dataframe if columns required are already present
-        if testColumn in floodDf.columns:
-            floodDf.set_index(["timestamp", "sensor-id", "station-id"], inplace=True)
-            fillerDf.set_index(["timestamp", "sensor-id", "station-id"], inplace=True)
-            floodDf.update(fillerDf)
-            floodDf.reset_index(inplace=True)
-        # Update floodDf if columns required not present
-        else:
-            fillerDf.drop(
-                columns=["timestamp", "sensor-id", "station-id"], inplace=True
+                "[COMPLETE]",
+                f"Finished weather timeshift of -{timeShift}h ({round(time()-startTime)}s) \n",
             )
-            floodDf = pd.concat([floodDf, fillerDf], axis=1)
 
-        log(
-            Back.GREEN,
-            "[COMPLETE]",
-            f"Finished weather timeshift of -{timeShift}h ({round(time()-startTime)}s) \n",
+    # Add new columns without copying floodDf or consolidating them into one block (which concat would copy)
+    del grid, pool
+    if newColumns:
+        floodDf = pd.DataFrame(
+            {**{column: floodDf[column] for column in floodDf.columns}, **newColumns},
+            index=floodDf.index,
+            copy=False,
         )
 
     # Log time and return
@@ -368,6 +354,8 @@ def constructDataset(
     numReadings: int = 3,
     restrictDistance: int = None,
     restrictDate: list = None,
+    workers: int = None,
+    neighbours: int = None,
 ) -> pd.DataFrame:
     """
     Constructs a training dataset based on parameters given.\n\n
@@ -381,11 +369,16 @@ def constructDataset(
     `numreadings`: Number of moments in time where weather is measured (prior to prediction time)\n
     `restrictDistance`: Only accept rows where station-to-sensor distance is lower than this [optional]\n
     `restrictDate`: 1 or 2 date values to filter dates from start to end time, formatted as '2023-01-30'\n
+    `workers`: Number of processes used to inject weather data [optional]\n
+    `neighbours`: Interpolate weather at each sensor from this many closest stations, rather than only the closest station [optional]\n
     """
 
     # Fetch base datasets
     log(Back.CYAN, "[TASK]", "Fetching and saving base weather and flooding datasets")
     floodDf, weatherDf = getAllData(restrictDate)
+    # Keep names in side tables, out of the rows of the pipeline
+    floodDf, sensorNames = splitNames(floodDf, "sensor-id", "sensor-name")
+    weatherDf, stationNames = splitNames(weatherDf, "station-id", "station-name")
 
     # Restrict date range
     if restrictDate:
@@ -416,41 +409,6 @@ def constructDataset(
     log(Back.CYAN, "[TASK]", "Matching weather stations to flood sensors")
     floodDf = calculateClosestStation(floodDf, weatherDf)
 
-    # Check for existing full dataset and load it in
-    savePath = os.path.join(__file__, f"../data/trainingData.csv")
-    if os.path.isfile(savePath):
-        log(
-            Back.GREEN,
-            "[INFO]",
-            "Existing dataset found, updating dataset with required data",
-        )
-        log(
-            Back.RED,
-            "[WARN]",
-            "If reading size is different for this run than when existing dataset was first created, please remake the dataset",
-        )
-        existingDf = pd.read_csv(savePath)
-        existingDf["timestamp"] = pd.to_datetime(existingDf["timestamp"])
-
-        # Combine existing dataframe to current flooding dataframe (nulls to unknown values)
-        floodDf = pd.concat([existingDf, floodDf], ignore_index=True)
-        floodDf["timestamp"] = pd.to_datetime(floodDf["timestamp"])
-        floodDf = (
-            floodDf.drop_duplicates(subset=["timestamp", "sensor-id"])
-            .reset_index(drop=True)
-            .sort_values(by="timestamp")
-        )
-
-    # Inject weather data into flooding data based on factors (EXPENSIVE OPERATION)
-    floodDf = injectWeatherData(
-        floodDf,
-        weatherDf,
-        predictionTime,
-        intervalSize,
-        numReadings,
-        readingSize,
-    )
-
     # Get list of columns to keep
     timeShifts = [predictionTime + n * intervalSize for n in range(numReadings)]
     weatherColumns = [
@@ -465,27 +423,119 @@ def constructDataset(
     ]
     weatherColumns = [element for sublist in weatherColumns for element in sublist]
 
-    # Fill NaNs (DO NOT CHANGE REPLACEMENT NUMBER)
-    replacementNumber = -99999
-    floodDf[weatherColumns] = floodDf[weatherColumns].fillna(replacementNumber)
-
-    # Save the dataset
-    savePath = os.path.join(__file__, f"../data/trainingData.csv")
-    floodDf = floodDf.sort_values(by="timestamp")
-    floodDf.to_csv(savePath, index=False)
+    # Datasets are memoized per set of parameters and stations, and keyed by the data they were built from
+    stationSet = (
+        weatherDf.drop_duplicates(subset="station-id")[
+            ["station-id", "latitude", "longitude"]
+        ]
+        .astype({"station-id": str})
+        .sort_values(by="station-id")
+        .reset_index(drop=True)
+    )
+    datasetName = "trainingData-" + ArtifactCache.key(
+        predictionTime, intervalSize, readingSize, numReadings, neighbours, stationSet
+    )
+    datasetKey = ArtifactCache.key(floodDf, weatherDf)
+    existingDf = artifacts.load(datasetName, datasetKey)
+    if existingDf is not None:
+        log(Back.GREEN, "[INFO]", "Existing dataset found for this data and parameters")
+        floodDf = existingDf
+    else:
+        # Reuse weather from the latest dataset with the same parameters, for rows matched to the same station
+        existingDf = artifacts.latest(datasetName)
+        if existingDf is not None:
+            log(
+                Back.GREEN,
+                "[INFO]",
+                "Existing dataset found, updating dataset with required data",
+            )
+            # Use the current categories for ids, so they are compared by code, dropping rows of unknown ids
+            keys = ["timestamp", "sensor-id", "station-id"]
+            existingDf = existingDf[keys + weatherColumns]
+            known = existingDf["sensor-id"].notna().to_numpy()
+            for column in ["sensor-id", "station-id"]:
+                recoded = pd.Categorical(
+                    existingDf[column], categories=floodDf[column].cat.categories
+                )
+                known &= existingDf[column].isna().to_numpy() | pd.notna(recoded)
+                existingDf[column] = recoded
+            existingDf = existingDf[known].drop_duplicates(subset=keys)
+            floodDf = floodDf.merge(existingDf, how="left", on=keys)
+
+    # Calculate weather for rows missing it (including rows left out when saved, as their days were incomplete)
+    if weatherColumns[0] not in floodDf.columns or floodDf[weatherColumns].isna().any(
+        axis=None
+    ):
+        # Weight closest stations to each sensor, if interpolating weather
+        interpolation = None
+        if neighbours:
+            sensors = floodDf.drop_duplicates(subset="sensor-id")[
+                ["sensor-id", "sensor-latitude", "sensor-longitude"]
+            ].rename(
+                columns={"sensor-latitude": "latitude", "sensor-longitude": "longitude"}
+            )
+            stations = weatherDf.drop_duplicates(subset="station-id")
+            interpolation = WeightedStations(
+                sensors,
+                stations,
+                k=neighbours,
+                availability=StationAvailability(weatherDf, stations["station-id"]),
+            )
 
-    # Remove perviously filled NaNs
-    nanRowsMask = floodDf[weatherColumns].eq(replacementNumber).any(axis=1)
-    floodDf = floodDf[~nanRowsMask]
+        # Inject weather data into flooding data based on factors (EXPENSIVE OPERATION)
+        floodDf = injectWeatherData(
+            floodDf,
+            weatherDf,
+            predictionTime,
+            intervalSize,
+            numReadings,
+            readingSize,
+            workers,
+            interpolation,
+        )
 
-    # Filter columns needed
-    newColumns = list(floodDf.columns[:12]) + weatherColumns
-    floodDf = floodDf[newColumns]
+        # Save the dataset, leaving out weather of rows whose windows touch days the manifest does not mark complete,
+        # as those days may still change (missing weather stays NaN, so it is filled in when reused)
+        timestamps = floodDf["timestamp"].to_numpy()
+        complete = RangeManifest(os.path.join(DATADIR, "manifest.json")).covers(
+            "weather",
+            timestamps - pd.Timedelta(hours=timeShifts[-1] + readingSize / 2),
+            timestamps - pd.Timedelta(hours=timeShifts[0] - readingSize / 2),
+        )
+        # (weather of those rows is set aside while saving, rather than saving a copy of the whole dataset)
+        incomplete = ~complete
+        if incomplete.any():
+            incompleteWeather = floodDf.loc[incomplete, weatherColumns].to_numpy()
+            floodDf.loc[incomplete, weatherColumns] = np.nan
+        artifacts.save(datasetName, datasetKey, floodDf)
+        if incomplete.any():
+            floodDf.loc[incomplete, weatherColumns] = incompleteWeather
+            del incompleteWeather
+
+    # Remove rows missing weather, and filter columns needed (names are added back from side tables)
+    # Columns are moved over one at a time, so the dataset is never held twice
+    # (filtering their arrays rather than series, which would each filter their own copy of the index)
+    nameColumns = {"sensor-name": sensorNames, "station-name": stationNames}
+    keep = ~floodDf[weatherColumns].isna().any(axis=1).to_numpy()
+    floodDf = pd.DataFrame(
+        {
+            column: floodDf.pop(column).array[keep]
+            for column in [
+                column for column in DATASET_COLUMNS if column not in nameColumns
+            ]
+            + weatherColumns
+        },
+        index=floodDf.index[keep],
+        copy=False,
+    )
+    for column, names in nameColumns.items():
+        idColumn = column.replace("name", "id")
+        floodDf.insert(
+            DATASET_COLUMNS.index(column), column, lookupNames(floodDf[idColumn], names)
+        )
 
     # Restrict date range for full dataset
     if restrictDate:
-        floodDf["timestamp"] = pd.to_datetime(floodDf["timestamp"])
-        # Apply filters
         floodDf = floodDf[
             (floodDf["timestamp"] >= startDate) & (floodDf["timestamp"] <= endDate)
         ].reset_index(drop=True)
@@ -506,7 +556,7 @@ def constructDataset(
         "[INFO]",
         f"Produced dataset with {floodDf.shape[0]} rows\n",
     )
-    floodDf.to_csv(os.path.join(__file__, f"../data/currentTrainingData.csv"))
+    floodDf.to_csv(os.path.join(DATADIR, "currentTrainingData.csv"))
     return floodDf
 
 
@@ -515,7 +565,7 @@ def saveModel(model, fileName):
     """
     Ensure filename includes file extension.
     """
-    saveDir = os.path.join(__file__, "../models/")
+    saveDir = os.path.abspath(os.path.join(__file__, "../models"))
     if not os.path.isdir(saveDir):
         os.makedirs(saveDir)
     joblib.dump(model, os.path.join(saveDir, fileName))
@@ -1,9 +1,11 @@
 try:
-    from .db import fetchFromDatabase
+    from .storage import FloodStore, MongoFloodStore, SQLiteFloodStore, getStore
+    from .mirror import FloodMirror
+    from .myutils import addSensorDetails, addRollupDetails
+    from .records import RETENTION
 except:
     import requests, os
-    from db import deleteDuplicates, saveToDatabase, cleanDatabase
-    from dotenv import load_dotenv, find_dotenv
+    from storage import MongoFloodStore, getStore
     from myutils import parseFlooding
 
 
@@ -16,12 +18,14 @@ if __name__ == "__main__":
     data = parseFlooding(response.content.decode("utf-8"))
 
     # Verify environment variable
-    load_dotenv(find_dotenv())
-    mongoURI = os.environ.get("MONGODB_URI")
-    print(f"\n\nFirst few characters of mongoDB access string {mongoURI[:7]}\n\n")
+    store = getStore()
+    if isinstance(store, MongoFloodStore):
+        mongoURI = os.environ.get("MONGODB_URI")
+        print(f"\n\nFirst few characters of mongoDB access string {mongoURI[:7]}\n\n")
 
     # Save modified data to database
     data = data[["timestamp", "sensor-id", "water-level", "status"]]
     print(data, "\n\n", data.info(), end="\n\n")
-    saveToDatabase(deleteDuplicates(data))
-    cleanDatabase()
+    store.save(data)
+    if isinstance(store, MongoFloodStore):
+        print(f"MongoDB clients created: {store.db.connectCount()}")
@@ -0,0 +1,234 @@
+# Resident flood ingest, polling water levels and saving new readings through a flood store
+import os, json, signal, sqlite3, asyncio, hashlib, requests
+from collections import deque
+from datetime import datetime
+from time import monotonic
+from zoneinfo import ZoneInfo
+
+try:
+    from .myutils import parseFlooding
+    from .records import FIELDS
+    from .storage import FloodStore, getStore
+except:
+    from myutils import parseFlooding
+    from records import FIELDS
+    from storage import FloodStore, getStore
+
+ENDPOINT = "https://app.pub.gov.sg/waterlevel/pages/GetWLInfo.aspx"
+PARAMS = {"type": "WL"}
+INTERVAL = 900  # Seconds between polls (FLOOD_INTERVAL overrides, at least MININTERVAL)
+MININTERVAL = 60  # Shortest interval accepted
+RETRYLIMIT = 96  # Most payloads held for retrying while the store is unavailable
+TIMEZONE = ZoneInfo("Asia/Singapore")
+# Errors from which the store may recover, so saves failing with them are retried (others drop the payload)
+RETRYABLE = (ConnectionError, TimeoutError, sqlite3.OperationalError)
+try:
+    from pymongo.errors import ConnectionFailure, ExecutionTimeout, WTimeoutError
+
+    RETRYABLE += (ConnectionFailure, ExecutionTimeout, WTimeoutError)
+except ImportError:
+    pass
+
+
+class IngestDaemon:
+    """
+    Polls the water level API on an interval and saves new readings to a flood store, in one long-running process.\n
+    Payloads identical to the previous one are skipped by their hash. Saves run in a worker thread, so polling never waits
+    on the store. Payloads failing to save with a RETRYABLE (connection or timeout) error are held in a bounded queue
+    (dropping the oldest) and retried, while those failing with any other error are dropped, so they never block later ones.
+    Health and lag metrics are kept in metrics, and served as JSON on healthPort if one is given.
+
+    Parameters
+    ----------
+    `store`: Store to save readings to\n
+    `interval`: Seconds between polls\n
+    `retryLimit`: Most payloads held while saves are failing\n
+    `healthPort`: Port to serve metrics on (optional)
+    """
+
+    def __init__(
+        self,
+        store: FloodStore,
+        interval: int = INTERVAL,
+        retryLimit: int = RETRYLIMIT,
+        healthPort: int = None,
+    ):
+        self.store = store
+        self.interval = max(interval, MININTERVAL)
+        self.healthPort = healthPort
+        self.pending = deque(maxlen=retryLimit)
+        self.lastDigest = None
+        self.saving = (
+            None  # Payload being saved, which stays queued until its save succeeds
+        )
+        self.metrics = {
+            "polls": 0,
+            "pollErrors": 0,
+            "parseErrors": 0,
+            "skipped": 0,
+            "saves": 0,
+            "saveErrors": 0,
+            "dropped": 0,
+            "readingsSaved": 0,
+            "lastPoll": None,
+            "lastSave": None,
+            "newestReading": None,
+        }
+
+    def health(self) -> dict:
+        """
+        Returns the daemon's metrics, with the payloads waiting to be saved, the lag (seconds between now
+        and the newest reading saved) and whether the daemon is healthy (polled and saved within two intervals).
+        """
+        newest = self.metrics["newestReading"]
+        return {
+            **self.metrics,
+            "pending": len(self.pending),
+            "lag": self._secondsSince(newest) if newest else None,
+            "healthy": self._isRecent(self.metrics["lastPoll"])
+            and (self._isRecent(self.metrics["lastSave"]) or not self.pending),
+        }
+
+    def _now(self) -> str:
+        return datetime.now(TIMEZONE).replace(tzinfo=None).isoformat(timespec="seconds")
+
+    def _secondsSince(self, time: str) -> float:
+        return (
+            datetime.fromisoformat(self._now()) - datetime.fromisoformat(time)
+        ).total_seconds()
+
+    def _isRecent(self, time: str) -> bool:
+        return time is not None and self._secondsSince(time) < 2 * self.interval
+
+    @staticmethod
+    def _fetch() -> bytes:
+        response = requests.get(ENDPOINT, params=PARAMS, timeout=30)
+        response.raise_for_status()
+        return response.content
+
+    async def poll(self):
+        """
+        Fetches the latest payload and queues its readings, unless it is unchanged since the last poll.
+        """
+        self.metrics["polls"] += 1
+        try:
+            raw = await asyncio.to_thread(self._fetch)
+        except requests.RequestException as error:
+            self.metrics["pollErrors"] += 1
+            print(f"Poll failed: {error}")
+            return
+        self.metrics["lastPoll"] = self._now()
+
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest == self.lastDigest:
+            self.metrics["skipped"] += 1
+            return
+        self.lastDigest = digest
+        # A malformed payload is counted and skipped, so it never stops the daemon
+        try:
+            data = parseFlooding(raw.decode("utf-8"))[FIELDS]
+        except Exception as error:
+            self.metrics["parseErrors"] += 1
+            print(f"Parse failed: {error!r}")
+            return
+        # Only count a payload as dropped if the queue evicts one that is not being saved
+        if (
+            len(self.pending) == self.pending.maxlen
+            and self.pending[0] is not self.saving
+        ):
+            self.metrics["dropped"] += 1
+        self.pending.append(data)
+
+    async def flush(self):
+        """
+        Saves queued payloads in order, stopping at the first RETRYABLE failure so it is retried on the next poll.
+        Payloads failing with other errors would fail again, so they are dropped and the next payload is saved.
+        """
+        while self.pending:
+            data = self.saving = self.pending[0]
+            try:
+                saved = await asyncio.to_thread(self.store.save, data)
+            except RETRYABLE as error:
+                self.metrics["saveErrors"] += 1
+                # A full queue may have evicted this payload while it was saving, losing it
+                if not (self.pending and self.pending[0] is data):
+                    self.metrics["dropped"] += 1
+                print(f"Save failed, {len(self.pending)} payloads pending: {error}")
+                return
+            except Exception as error:
+                self.metrics["saveErrors"] += 1
+                self.metrics["dropped"] += 1
+                if self.pending and self.pending[0] is data:
+                    self.pending.popleft()
+                print(f"Save failed, dropping payload: {error!r}")
+                continue
+            finally:
+                self.saving = None
+            # A full queue may have dropped this payload while it was saving
+            if self.pending and self.pending[0] is data:
+                self.pending.popleft()
+            self.metrics["saves"] += 1
+            self.metrics["readingsSaved"] += saved
+            self.metrics["lastSave"] = self._now()
+            if not data.empty:
+                newest = data["timestamp"].max().isoformat()
+                self.metrics["newestReading"] = max(
+                    newest, self.metrics["newestReading"] or newest
+                )
+
+    async def _serveHealth(self, reader, writer):
+        # Answer any request with the metrics, so the daemon can be checked with curl or a load balancer
+        await reader.readline()
+        health = self.health()
+        body = json.dumps(health).encode()
+        status = "200 OK" if health["healthy"] else "503 Service Unavailable"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        writer.close()
+
+    async def run(self):
+        """
+        Polls and saves every interval until the process is interrupted, saving what is pending before stopping.
+        """
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signalType in [signal.SIGINT, signal.SIGTERM]:
+            loop.add_signal_handler(signalType, stopping.set)
+        server = None
+        if self.healthPort:
+            server = await asyncio.start_server(self._serveHealth, port=self.healthPort)
+
+        print(f"Polling water levels every {self.interval}s")
+        flushing = None
+        while not stopping.is_set():
+            tickStart = monotonic()
+            await self.poll()
+            # Save in the background, so a slow store never delays the next poll
+            if self.pending and (flushing is None or flushing.done()):
+                flushing = asyncio.create_task(self.flush())
+            try:
+                timeout = max(self.interval - (monotonic() - tickStart), 0)
+                await asyncio.wait_for(stopping.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        if flushing is not None:
+            await flushing
+        await self.flush()
+        if server is not None:
+            server.close()
+        print(f"Stopped, {len(self.pending)} payloads unsaved: {self.health()}")
+
+
+# Run to ingest continuously, in place of the scheduled workflow
+if __name__ == "__main__":
+    store = getStore()
+    interval = int(os.environ.get("FLOOD_INTERVAL", INTERVAL))
+    healthPort = os.environ.get("FLOOD_HEALTH_PORT")
+    daemon = IngestDaemon(
+        store, interval, healthPort=int(healthPort) if healthPort else None
+    )
+    asyncio.run(daemon.run())
@@ -1,71 +1,108 @@
-import os, pandas as pd
-from datetime import datetime, timedelta
-from pymongo import MongoClient
-from dotenv import load_dotenv, find_dotenv
+import numpy as np, pandas as pd
+from datetime import datetime
+from itertools import islice
+from pymongo import ASCENDING
 from time import time
 from colorama import Fore, Back, Style
 
+try:
+    from .myutils import addSensorDetails, emptyReadings, emptyRollups, ROLLUPCOLUMNS
+    from .mongo import getClient, closeClient, connectCount, createIndexes
+    from .mongo import saveRecords, updateRollups, KEY, DUPLICATEKEY, INGESTED
+except:
+    from myutils import addSensorDetails, emptyReadings, emptyRollups, ROLLUPCOLUMNS
+    from mongo import getClient, closeClient, connectCount, createIndexes
+    from mongo import saveRecords, updateRollups, KEY, DUPLICATEKEY, INGESTED
+
+BATCHSIZE = 50_000  # Readings fetched from the server at a time when streaming
+PROJECTION = {"_id": 0, "timestamp": 1, "sensor-id": 1, "water-level": 1, "status": 1}
+
 
 def saveToDatabase(data: pd.DataFrame):
     """
-    Saves given flood data to a MongoDB database.
+    Saves given flood data to a MongoDB database, skipping readings already in the database.
     One save of flooding data yields about 4.10kB of data.
+    Timestamps are saved as BSON dates, holding Singapore time as MongoDB holds UTC.\n
+    Readings are upserted on their (sensor-id, timestamp) key, which is backed by a unique index,
+    so the cost of a save depends only on the size of the data saved.
     """
 
-    data = list(data.T.to_dict().values())
-    # Connect to Mongo, create db and collection
-    load_dotenv(find_dotenv())
-    mongoURI = os.environ.get("MONGODB_URI")
-    client = MongoClient(mongoURI)
-    db = client.floodData
-    result = db.floodData.insert_many(documents=data)
-    client.close()
+    # Insert each reading only if its key is not yet present, with timestamps stored as dates
+    data = data.assign(timestamp=pd.to_datetime(data["timestamp"]))
+    return saveRecords(data.to_dict("records"))
+
 
-    # Log results
-    if result:
-        print(f"Database write successful, wrote {len(data)} documents to collection")
+def streamFromDatabase(query=None, since: datetime = None, batchSize: int = BATCHSIZE):
+    """
+    Streams flooding readings from the MongoDB database as dataframes of up to batchSize readings each,
+    so that documents are never all held in memory at once. Only the fields in PROJECTION are fetched.
+
+    Parameters
+    ----------
+    `query`: Query to filter readings with (optional)\n
+    `since`: Stream documents in order of saving, only those saved by the server at or after this time (optional).
+    Pass datetime.min for all documents, including those saved before their save time was kept.
+    The time the last document in each chunk was saved is kept in chunk.attrs["lastIngested"]\n
+    `batchSize`: Number of readings in each chunk
+    """
+    query = dict(query or {})
+    collection = getClient().floodData.floodData
+    if since is None:
+        cursor = collection.find(query, PROJECTION)
+    else:
+        if since > datetime.min:
+            query[INGESTED] = {"$gte": since}
+        cursor = collection.find(query, PROJECTION | {INGESTED: 1}).sort(
+            INGESTED, ASCENDING
+        )
+    cursor = cursor.batch_size(batchSize)
+
+    while True:
+        # Fill typed columns document by document
+        timestamps, sensorIds = [], []
+        waterLevels = np.empty(batchSize, dtype=np.float64)
+        statuses = np.empty(batchSize, dtype=np.int8)
+        size = 0
+        for document in islice(cursor, batchSize):
+            timestamps.append(document["timestamp"])
+            sensorIds.append(document["sensor-id"])
+            waterLevels[size] = document["water-level"]
+            statuses[size] = document["status"]
+            size += 1
+        if not size:
+            return
+
+        chunk = pd.DataFrame(
+            {
+                "timestamp": pd.to_datetime(timestamps, format="ISO8601"),
+                "sensor-id": sensorIds,
+                "water-level": waterLevels[:size],
+                "status": statuses[:size],
+            }
+        )
+        chunk.attrs["lastIngested"] = document.get(INGESTED)
+        yield chunk
+        if size < batchSize:
+            return
 
 
 def fetchFromDatabase(query=None):
     """Fetches all flooding data from the MongoDB database.
     Optionally provide a query to filter results"""
 
-    # Connect to Mongo
-    load_dotenv(find_dotenv())
-    mongoURI = os.environ.get("MONGODB_URI")
-    client = MongoClient(mongoURI)
-
     # Get collection data
     print(
         Fore.BLACK + Back.WHITE + "[GET]" + Style.RESET_ALL,
         end=" Getting flooding data from mongo\n",
     )
     fetchTimer = time()
-    db = client.floodData
-    floodDf = pd.DataFrame(list(db.floodData.find(query))).drop(columns=["_id"])
+    chunks = list(streamFromDatabase(query))
+    floodDf = pd.concat(chunks, ignore_index=True) if chunks else emptyReadings()
 
     # Append required data to the dataset
-    sensorPath = os.path.abspath(os.path.join(__file__, "../floodmax/sensors.csv"))
-    sensors = pd.read_csv(sensorPath)
-    floodDf = floodDf.merge(sensors, on="sensor-id").sort_values(
-        by="timestamp", ascending=True
-    )
-    floodDf[r"% full"] = round((floodDf["water-level"] / floodDf["max-level"]) * 100, 2)
-    floodDf = floodDf[
-        [
-            "timestamp",
-            "sensor-id",
-            "sensor-name",
-            "latitude",
-            "longitude",
-            "max-level",
-            "% full",
-            "status",
-        ]
-    ]
+    floodDf = addSensorDetails(floodDf)
 
-    # Close the connection and return the data
-    client.close()
+    # Return the data
     print(
         Fore.BLACK
         + Back.GREEN
@@ -75,55 +112,56 @@ def fetchFromDatabase(query=None):
     return floodDf
 
 
+def fetchRollups(
+    resolution: str = "1h",
+    start: datetime = None,
+    end: datetime = None,
+    sensors: list = None,
+) -> pd.DataFrame:
+    """
+    Fetches rollups at a resolution (1h or 1d) for periods starting from start (inclusive) to end (exclusive),
+    optionally only for some sensors. Rollups are ordered by period and sensor.
+    """
+    query = {}
+    if start is not None or end is not None:
+        query["_id.timestamp"] = {}
+        if start is not None:
+            query["_id.timestamp"]["$gte"] = start
+        if end is not None:
+            query["_id.timestamp"]["$lt"] = end
+    if sensors is not None:
+        query["_id.sensor-id"] = {"$in": list(sensors)}
+    collection = getClient().floodData[f"floodRollups{resolution}"]
+    rollups = [
+        {**document.pop("_id"), **document} for document in collection.find(query)
+    ]
+    if not rollups:
+        return emptyRollups()
+    rollupDf = pd.DataFrame(rollups)[ROLLUPCOLUMNS]
+    rollupDf["timestamp"] = pd.to_datetime(rollupDf["timestamp"])
+    return rollupDf.sort_values(by=["timestamp", "sensor-id"]).reset_index(drop=True)
+
+
 def deleteDuplicates(floodDf):
     """
-    Deletes all entries in a flood dataframe that are already present in the mongo database.
+    Deletes all entries in a flood dataframe that are already present in the mongo database.\n
+    Only the keys of the given entries are looked up. Not needed before saveToDatabase, which skips duplicates itself.
     """
     # Connect to MongoDB
-    load_dotenv(find_dotenv())
-    mongoURI = os.environ.get("MONGODB_URI")
-    client = MongoClient(mongoURI)
+    client = getClient()
     db = client.floodData
     collection = db.floodData
 
-    # Get existing composite keys from MongoDB
-    existingKeysCursor = collection.find({}, {"timestamp": 1, "sensor-id": 1, "_id": 0})
-    existingKeys = set(
-        (doc["timestamp"], doc["sensor-id"]) for doc in existingKeysCursor
+    # Get existing composite keys from MongoDB, among those in the dataframe
+    query = {key: {"$in": floodDf[key].unique().tolist()} for key in KEY}
+    existingKeysCursor = collection.find(query, {key: 1 for key in KEY} | {"_id": 0})
+    existingKeys = pd.MultiIndex.from_tuples(
+        [tuple(doc[key] for key in KEY) for doc in existingKeysCursor], names=KEY
     )
     # Filter and return DataFrame based on existing keys
     origLength = floodDf.shape[0]
-    floodDf = floodDf[
-        ~floodDf.apply(
-            lambda row: (row["timestamp"], row["sensor-id"]) in existingKeys, axis=1
-        )
-    ]
+    floodDf = floodDf[~pd.MultiIndex.from_frame(floodDf[KEY]).isin(existingKeys)]
     print(
         f"{origLength-floodDf.shape[0]} duplicate entries excluded from database write"
     )
-    client.close()
     return floodDf
-
-
-def cleanDatabase():
-    """
-    Cleans the database, deleting entries older than 1yo+
-    """
-    # Connect to Mongo, create db and collection
-    load_dotenv(find_dotenv())
-    mongoURI = os.environ.get("MONGODB_URI")
-    client = MongoClient(mongoURI)
-    db = client.floodData
-    collection = db.floodData
-
-    # Calculate the timestamp threshold (1 year ago from the current time)
-    twoYearsAgo = datetime.now() - timedelta(days=731)
-    timestampThreshold = twoYearsAgo.isoformat()  # Convert to ISO format string
-
-    # Define the deletion query and delete
-    query = {"timestamp": {"$lt": timestampThreshold}}
-    result = collection.delete_many(query)
-    print(f"Deleted {result.deleted_count} documents from more than 2 years ago")
-
-    # Close the MongoDB connection
-    client.close()
@@ -0,0 +1,62 @@
+# Lean ingest of the latest water levels, for scheduled runs where start up time dominates
+# Needs only the standard library and pymongo (see ingestreq.txt), so pandas is never imported
+import os
+
+try:
+    from .records import parseReadings
+except:
+    from records import parseReadings
+
+ENDPOINT = "https://app.pub.gov.sg/waterlevel/pages/GetWLInfo.aspx?type=WL"
+
+
+def checkStore():
+    """
+    Raises a ValueError if FLOOD_STORE selects a store other than MongoDB, as this path only saves to MongoDB.
+    Run flooding/__init__.py to save through the store set by FLOOD_STORE instead.
+    """
+    # Only look for a .env file when the environment does not hold the database address, as getClient does
+    if "FLOOD_STORE" not in os.environ and "MONGODB_URI" not in os.environ:
+        from dotenv import load_dotenv, find_dotenv
+
+        load_dotenv(find_dotenv())
+    kind = os.environ.get("FLOOD_STORE", "mongodb").lower()
+    if kind != "mongodb":
+        raise ValueError(
+            f"Lean ingest only saves to mongodb, but FLOOD_STORE is {kind}. Run flooding/__init__.py instead"
+        )
+
+
+def fetchPayload() -> str:
+    """
+    Fetches the latest raw payload from the water level API.
+    """
+    from urllib.request import urlopen
+
+    with urlopen(ENDPOINT, timeout=30) as response:
+        return response.read().decode("utf-8")
+
+
+def ingest(raw: str) -> int:
+    """
+    Parses a raw payload and saves its readings to the database, updating the rollups of the days saved.
+    Returns the number of readings saved.
+    """
+    try:
+        from .mongo import saveRecords, updateRollups
+    except:
+        from mongo import saveRecords, updateRollups
+
+    checkStore()
+    readings = parseReadings(raw)
+    saved = saveRecords(readings)
+    if saved:
+        timestamps = [reading["timestamp"] for reading in readings]
+        updateRollups(min(timestamps), max(timestamps))
+    return saved
+
+
+# Run periodically to save to database
+if __name__ == "__main__":
+    checkStore()
+    ingest(fetchPayload())
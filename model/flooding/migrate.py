@@ -0,0 +1,80 @@
+# Migrates flood readings saved with string timestamps to BSON dates, in batches
+from datetime import datetime
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+
+try:
+    from .db import getClient, createIndexes, DUPLICATEKEY
+    from .records import ROLLUPS
+except:
+    from db import getClient, createIndexes, DUPLICATEKEY
+    from records import ROLLUPS
+
+BATCHSIZE = 10_000  # Documents migrated in each bulk write
+
+
+def migrateTimestamps(batchSize: int = BATCHSIZE) -> tuple[int, int]:
+    """
+    Converts string timestamps in the flooding collection to dates, batchSize documents at a time.
+    Readings whose converted key is already present (saved as a date by a newer ingest) are deleted.
+    Safe to stop and run again. Returns the number of documents converted and deleted.
+    """
+    collection = getClient().floodData.floodData
+    converted = deleted = 0
+    while True:
+        batch = list(
+            collection.find({"timestamp": {"$type": "string"}}, {"timestamp": 1})
+            .sort("_id", 1)
+            .limit(batchSize)
+        )
+        if not batch:
+            break
+        operations = [
+            UpdateOne(
+                {"_id": document["_id"]},
+                {"$set": {"timestamp": datetime.fromisoformat(document["timestamp"])}},
+            )
+            for document in batch
+        ]
+        try:
+            converted += collection.bulk_write(operations, ordered=False).modified_count
+        except BulkWriteError as error:
+            details = error.details
+            if any(e["code"] != DUPLICATEKEY for e in details["writeErrors"]):
+                raise
+            converted += details["nModified"]
+            # Drop string copies of readings that already exist as dates
+            duplicates = [
+                DeleteOne({"_id": batch[e["index"]]["_id"]})
+                for e in details["writeErrors"]
+            ]
+            deleted += collection.bulk_write(duplicates).deleted_count
+        print(f"Converted {converted} timestamps, deleted {deleted} duplicates")
+    return converted, deleted
+
+
+def migrateRollups() -> int:
+    """
+    Copies the period start of rollups saved without one out of their _id, so their TTL index can expire them.
+    Returns the number of rollups updated.
+    """
+    database = getClient().floodData
+    updated = 0
+    for resolution in ROLLUPS:
+        updated += (
+            database[f"floodRollups{resolution}"]
+            .update_many(
+                {"timestamp": {"$exists": False}},
+                [{"$set": {"timestamp": "$_id.timestamp"}}],
+            )
+            .modified_count
+        )
+    print(f"Added period starts to {updated} rollups")
+    return updated
+
+
+# Run once after upgrading, before the next ingest
+if __name__ == "__main__":
+    migrateTimestamps()
+    migrateRollups()
+    createIndexes(getClient().floodData)
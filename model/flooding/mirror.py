@@ -0,0 +1,88 @@
+# Local mirror of the flooding database, kept up to date incrementally
+import os, json, uuid, pandas as pd
+from datetime import datetime, timedelta
+
+try:
+    from .myutils import addSensorDetails
+    from .storage import SQLiteFloodStore
+except:
+    from myutils import addSensorDetails
+    from storage import SQLiteFloodStore
+
+OVERLAP = timedelta(
+    minutes=10
+)  # Copied again before the mark, as saves can end out of order
+
+
+class FloodMirror:
+    """
+    Copy of the readings in the flooding database, kept in an embedded SQLite store in a directory.\n
+    The server time at which the last document copied was saved (its ingestedAt) is kept as a high-water mark,
+    so each sync only pulls documents saved since the previous one, whichever process saved them. Each sync
+    starts OVERLAP before the mark, as saves can finish out of order, and readings copied twice are skipped by
+    their (sensor-id, timestamp) key. Readings deleted from the database are kept in the mirror.
+    Reading the mirror needs no network access (or pymongo).
+
+    Parameters
+    ----------
+    `path`: Directory in which the mirror is kept
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.markPath = os.path.join(self.path, "mark.json")
+        self.store = SQLiteFloodStore(os.path.join(self.path, "floods.db"))
+
+    def highWaterMark(self) -> datetime:
+        """
+        Returns the time the last document copied was saved, or None if nothing has been copied
+        (or the mark was kept by an older version, so everything is copied again).
+        """
+        if not os.path.isfile(self.markPath):
+            return None
+        with open(self.markPath) as file:
+            mark = json.load(file).get("lastIngested")
+        return datetime.fromisoformat(mark) if mark else None
+
+    def _saveMark(self, lastIngested: datetime):
+        # Replace the mark in one step, so an interrupted sync never leaves a partial file
+        temporaryPath = f"{self.markPath}.{uuid.uuid4().hex}"
+        with open(temporaryPath, "w") as file:
+            json.dump({"lastIngested": lastIngested.isoformat()}, file)
+        os.replace(temporaryPath, self.markPath)
+
+    def sync(self) -> int:
+        """
+        Copies documents saved to the database since the last sync to the mirror,
+        one streamed chunk at a time. Returns the number of readings copied.
+        """
+        try:
+            from .db import streamFromDatabase
+        except:
+            from db import streamFromDatabase
+
+        appended = 0
+        mark = self.highWaterMark()
+        since = mark - OVERLAP if mark else datetime.min
+        for chunk in streamFromDatabase(since=since):
+            # Move the mark only once the chunk is saved, so no documents are skipped.
+            # Readings saved again (from the overlap, or an interrupted sync) are skipped by the store's key
+            appended += self.store.save(chunk)
+            if chunk.attrs["lastIngested"] is not None:
+                mark = max(mark or datetime.min, chunk.attrs["lastIngested"])
+                self._saveMark(mark)
+        print(f"Mirrored {appended} new flooding readings")
+        return appended
+
+    def read(self, withDetails: bool = True) -> pd.DataFrame:
+        """
+        Reads all readings in the mirror, with sensor details added (as fetchFromDatabase returns them)
+        unless withDetails is False.
+        """
+        floodDf = self.store.fetchRange()
+        return addSensorDetails(floodDf) if withDetails else floodDf
+
+
+# Run to bring the default mirror up to date, for training without network access
+if __name__ == "__main__":
+    FloodMirror(os.path.dirname(SQLiteFloodStore().path)).sync()
@@ -0,0 +1,230 @@
+# MongoDB access needing only pymongo, shared by the flooding db functions and the lean ingest path
+import os, atexit, threading
+from datetime import datetime, timedelta
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
+
+try:
+    from .records import RETENTION, ROLLUPS, STATUSES
+except:
+    from records import RETENTION, ROLLUPS, STATUSES
+
+KEY = ["sensor-id", "timestamp"]  # Fields identifying a reading
+INGESTED = "ingestedAt"  # Field holding the server's time when a reading was last saved
+DUPLICATEKEY = 11000  # MongoDB error code for unique index violations
+POOLSIZE = 10  # Most connections open at once (MONGODB_POOLSIZE overrides)
+TIMEOUT = 10_000  # Milliseconds to wait on the server (MONGODB_TIMEOUT overrides)
+
+# Client shared by all database functions, created on first use
+sharedClient = None
+clientLock = threading.Lock()
+connects = 0  # Number of clients created, for checking that connections are reused
+indexed = False  # Whether indexes have been created by this process
+
+
+def getClient() -> MongoClient:
+    """
+    Gets the MongoDB client shared by the process, creating it on first use.\n
+    The client pools connections, so it is safe to share between threads. It is closed when the process exits.
+    """
+    global sharedClient, connects
+    with clientLock:
+        if sharedClient is None:
+            # Only look for a .env file when the environment does not hold the database address
+            if "MONGODB_URI" not in os.environ:
+                from dotenv import load_dotenv, find_dotenv
+
+                load_dotenv(find_dotenv())
+            timeout = int(os.environ.get("MONGODB_TIMEOUT", TIMEOUT))
+            sharedClient = MongoClient(
+                os.environ.get("MONGODB_URI"),
+                maxPoolSize=int(os.environ.get("MONGODB_POOLSIZE", POOLSIZE)),
+                connectTimeoutMS=timeout,
+                serverSelectionTimeoutMS=timeout,
+                socketTimeoutMS=timeout * 6,
+            )
+            connects += 1
+        return sharedClient
+
+
+def closeClient():
+    """
+    Closes the shared MongoDB client, if one is open. A new one is created if getClient is called again.
+    """
+    global sharedClient
+    with clientLock:
+        if sharedClient is not None:
+            sharedClient.close()
+            sharedClient = None
+
+
+atexit.register(closeClient)
+
+
+def connectCount() -> int:
+    """Returns the number of clients created by the process, for checking that connections are reused."""
+    return connects
+
+
+def saveRecords(records: list[dict]) -> int:
+    """
+    Saves readings (dicts of FIELDS, with datetime timestamps) to the database, skipping those already saved,
+    and returns the number saved.\n
+    Readings are upserted on their (sensor-id, timestamp) key, which is backed by a unique index,
+    so the cost of a save depends only on the number of readings saved.
+    Inserted readings are given the server's time in INGESTED, so readings can be copied incrementally
+    whichever process saved them, while readings already saved are matched and left alone.
+    """
+    # Insert each reading only if its key is not yet present
+    operations = [
+        UpdateOne(
+            {key: record[key] for key in KEY},
+            [{"$set": insertedFields(record)}],
+            upsert=True,
+        )
+        for record in records
+    ]
+    # Connect to Mongo, create db and collection (indexes are created once per process)
+    global indexed
+    database = getClient().floodData
+    if not indexed:
+        createIndexes(database)
+        indexed = True
+    collection = database.floodData
+    inserted = 0
+    if operations:
+        try:
+            inserted = collection.bulk_write(operations, ordered=False).upserted_count
+        except BulkWriteError as error:
+            # Readings upserted concurrently by another writer fail on the unique index
+            details = error.details
+            if any(e["code"] != DUPLICATEKEY for e in details["writeErrors"]):
+                raise
+            inserted = details["nUpserted"]
+
+    # Log results
+    print(f"Database write successful, wrote {inserted} documents to collection")
+    print(
+        f"{len(operations) - inserted} duplicate entries excluded from database write"
+    )
+    return inserted
+
+
+def insertedFields(record: dict) -> dict:
+    """
+    Gets the fields of an update pipeline stage saving a reading, each keeping the value already saved if there is one.
+    Saving a reading that is already present therefore changes nothing, so it is not written again
+    and keeps the INGESTED time it was first saved at (pipeline updates need MongoDB 4.2).
+    """
+    return {
+        **{
+            field: {"$ifNull": [f"${field}", {"$literal": value}]}
+            for field, value in record.items()
+            if field not in KEY
+        },
+        INGESTED: {"$ifNull": [f"${INGESTED}", "$$NOW"]},
+    }
+
+
+def createIndexes(database):
+    """
+    Creates the unique index on (sensor-id, timestamp) that keeps readings from being saved twice.
+    Duplicate readings saved before the index existed are deleted first, keeping the earliest saved copy.\n
+    Also creates the TTL indexes through which MongoDB deletes readings and rollups older than RETENTION,
+    the index on INGESTED used to copy readings incrementally, and the index rollups are fetched by.
+    """
+    expiry = int(RETENTION.total_seconds())
+    for resolution in ROLLUPS:
+        rollups = database[f"floodRollups{resolution}"]
+        rollups.create_index("timestamp", expireAfterSeconds=expiry)
+        rollups.create_index("_id.timestamp")
+    collection = database.floodData
+    collection.create_index("timestamp", expireAfterSeconds=expiry)
+    collection.create_index(INGESTED)
+    try:
+        collection.create_index([(key, ASCENDING) for key in KEY], unique=True)
+    except OperationFailure as error:
+        if error.code != DUPLICATEKEY:
+            raise
+        duplicates = collection.aggregate(
+            [
+                {"$sort": {"_id": 1}},
+                {
+                    "$group": {
+                        "_id": {key: f"${key}" for key in KEY},
+                        "ids": {"$push": "$_id"},
+                    }
+                },
+                {"$match": {"ids.1": {"$exists": True}}},
+            ],
+            allowDiskUse=True,
+        )
+        extras = [id for group in duplicates for id in group["ids"][1:]]
+        result = collection.delete_many({"_id": {"$in": extras}})
+        print(
+            f"Deleted {result.deleted_count} duplicate documents saved before indexing"
+        )
+        collection.create_index([(key, ASCENDING) for key in KEY], unique=True)
+
+
+def updateRollups(start: datetime = None, end: datetime = None):
+    """
+    Recalculates the rollups of every sensor over the days from start to end (both optional) from raw readings,
+    merging them into one collection per resolution (floodRollups1h and floodRollups1d).\n
+    Rollups are calculated in the database by an aggregation pipeline, so readings are never downloaded.
+    Recalculating a period replaces its rollups, so periods can be updated as often as readings arrive.
+    """
+    # Cover whole days, so that the first and last periods are calculated from all of their readings
+    match = {}
+    if start is not None:
+        match["$gte"] = datetime.combine(start.date(), datetime.min.time())
+    if end is not None:
+        match["$lt"] = datetime.combine(end.date(), datetime.min.time()) + timedelta(
+            days=1
+        )
+    database = getClient().floodData
+    for resolution, unit in ROLLUPS.items():
+        database.floodData.aggregate(
+            [
+                *([{"$match": {"timestamp": match}}] if match else []),
+                {
+                    "$group": {
+                        "_id": {
+                            "sensor-id": "$sensor-id",
+                            "timestamp": {"$dateFromParts": periodStart(unit)},
+                        },
+                        "readings": {"$sum": 1},
+                        "mean-water-level": {"$avg": "$water-level"},
+                        "max-water-level": {"$max": "$water-level"},
+                        "min-water-level": {"$min": "$water-level"},
+                        **{
+                            f"status-{status}": {
+                                "$sum": {"$cond": [{"$eq": ["$status", status]}, 1, 0]}
+                            }
+                            for status in STATUSES
+                        },
+                    }
+                },
+                # Keep the period start outside of _id too, as TTL indexes cannot be on _id
+                {"$set": {"timestamp": "$_id.timestamp"}},
+                {
+                    "$merge": {
+                        "into": f"floodRollups{resolution}",
+                        "on": "_id",
+                        "whenMatched": "replace",
+                        "whenNotMatched": "insert",
+                    }
+                },
+            ],
+            allowDiskUse=True,
+        )
+
+
+def periodStart(unit: str) -> dict:
+    """
+    Gets the parts of the start of the period (hour or day) holding a reading's timestamp, for $dateFromParts.
+    Used over $dateTrunc so that rollups also work on MongoDB versions before 5.0.
+    """
+    parts = {"year": "$year", "month": "$month", "day": "$dayOfMonth", "hour": "$hour"}
+    names = list(parts)[: list(parts).index(unit) + 1]
+    return {name: {parts[name]: "$timestamp"} for name in names}
@@ -1,52 +1,158 @@
-from datetime import datetime
-import pandas as pd
+import os, numpy as np, pandas as pd
+
+try:
+    from .records import splitRecords, parseTimestamp, STATUSES
+except:
+    from records import splitRecords, parseTimestamp, STATUSES
+
+ROLLUPCOLUMNS = [
+    "timestamp",
+    "sensor-id",
+    "readings",
+    "mean-water-level",
+    "max-water-level",
+    "min-water-level",
+    *[f"status-{status}" for status in STATUSES],
+]  # Fields of a rollup, where timestamp is the start of the period it covers
 
 
 def parseFlooding(raw: str):
     """
     Parses raw flooding data received from the API into a dataframe.
     """
-    # Treat data
-    dataSplit = [
-        [data for data in sensor.split("$#$")] for sensor in raw.split("$#$$@$")
+    # Treat data, skipping malformed and duplicate records
+    columns = {
+        "timestamp": [],
+        "sensor-id": [],
+        "sensor-name": [],
+        "latitude": [],
+        "longitude": [],
+        "water-level": [],
+        "status": [],
+    }
+    for record in splitRecords(raw):
+        columns["timestamp"].append(parseTimestamp(record[6]))
+        columns["sensor-id"].append(record[0])
+        columns["sensor-name"].append(record[1])
+        columns["latitude"].append(record[3])
+        columns["longitude"].append(record[2])
+        columns["water-level"].append(record[4])
+        columns["status"].append(record[5])
+
+    # Convert columns to their types all at once
+    for column in ["latitude", "longitude", "water-level"]:
+        columns[column] = np.array(columns[column], dtype=np.float64)
+    columns["status"] = np.array(columns["status"], dtype=np.int64)
+    df = pd.DataFrame(columns)
+    return df.sort_values(by=["timestamp", "sensor-id"]).reset_index(drop=True)
+
+
+def addSensorDetails(floodDf: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds details of each reading's sensor (from floodmax/sensors.csv) to flooding readings,
+    and converts water levels to how full each drain is. Readings from unknown sensors are dropped.
+    """
+    floodDf = joinSensors(floodDf).sort_values(by="timestamp", ascending=True)
+    floodDf[r"% full"] = round((floodDf["water-level"] / floodDf["max-level"]) * 100, 2)
+    return floodDf[
+        [
+            "timestamp",
+            "sensor-id",
+            "sensor-name",
+            "latitude",
+            "longitude",
+            "max-level",
+            "% full",
+            "status",
+        ]
     ]
-    data = []
-    for record in dataSplit:
-        # Convert data to dict, removing duplicates
-        if record not in data and len(record) == 7:
-            data.append(
-                {
-                    "timestamp": parseTimestamp(record[6]),
-                    "sensor-id": record[0],
-                    "sensor-name": record[1],
-                    "latitude": float(record[3]),
-                    "longitude": float(record[2]),
-                    "water-level": float(record[4]),
-                    "status": int(record[5]),
-                }
-            )
-    df = pd.DataFrame(data)
-    try:
-        return df.sort_values(by=["timestamp", "sensor-id"]).reset_index(drop=True)
-    except:
-        print(df)
-        return df.sort_values(by=["timestamp", "sensor-id"]).reset_index(drop=True)
-
-
-def parseTimestamp(timestamp: str):
-    """
-    Parses flood observation timestamps, accounting for possible errors/format issues.
-    """
-    # Standardise timestamp, zero pad all
-    timestamp = timestamp.split(" ")
-    while "" in timestamp:
-        timestamp.remove("")
-    # Pad day
-    if len(timestamp[1]) < 2:
-        timestamp[1] = "0" + timestamp[1]
-    # Pad time
-    if len(timestamp[-1].split(":")[0]) < 2:
-        timestamp[-1] = "0" + timestamp[-1]
-    timestamp = " ".join(timestamp)
-    timestamp = datetime.strptime(timestamp, "%b %d %Y  %I:%M%p")
-    return str(timestamp)
+
+
+def emptyReadings() -> pd.DataFrame:
+    """Returns a dataframe with the columns and types of the chunks from streamFromDatabase, with no readings."""
+    return pd.DataFrame(
+        {
+            "timestamp": pd.Series(dtype="datetime64[ns]"),
+            "sensor-id": pd.Series(dtype=object),
+            "water-level": pd.Series(dtype=np.float64),
+            "status": pd.Series(dtype=np.int8),
+        }
+    )
+
+
+def addRollupDetails(rollupDf: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds details of each rollup's sensor (from floodmax/sensors.csv) to flooding rollups,
+    and converts mean and max water levels to how full each drain was. Rollups of unknown sensors are dropped.
+    """
+    rollupDf = joinSensors(rollupDf).sort_values(
+        by=["timestamp", "sensor-id"], ascending=True
+    )
+    for stat in ["mean", "max"]:
+        rollupDf[f"{stat} % full"] = round(
+            (rollupDf[f"{stat}-water-level"] / rollupDf["max-level"]) * 100, 2
+        )
+    return rollupDf[
+        [
+            "timestamp",
+            "sensor-id",
+            "sensor-name",
+            "latitude",
+            "longitude",
+            "max-level",
+            "readings",
+            "mean % full",
+            "max % full",
+            *[f"status-{status}" for status in STATUSES],
+        ]
+    ].reset_index(drop=True)
+
+
+def emptyRollups() -> pd.DataFrame:
+    """Returns a dataframe with the columns and types of rollups, with no rollups."""
+    return pd.DataFrame(
+        {
+            "timestamp": pd.Series(dtype="datetime64[ns]"),
+            "sensor-id": pd.Series(dtype=object),
+            "readings": pd.Series(dtype=np.int64),
+            **{
+                column: pd.Series(dtype=np.float64)
+                for column in ["mean-water-level", "max-water-level", "min-water-level"]
+            },
+            **{f"status-{status}": pd.Series(dtype=np.int64) for status in STATUSES},
+        }
+    )
+
+
+def joinSensors(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the details of each row's sensor (from floodmax/sensors.csv), dropping rows of unknown sensors.\n
+    Each sensor is looked up once and rows take details by its position in sensors.csv (its code in the id registry),
+    rather than joining on sensor id strings.
+    """
+    sensors = readSensors()
+    ids = df["sensor-id"]
+    if isinstance(ids.dtype, pd.CategoricalDtype):
+        codes = np.append(
+            pd.Index(sensors["sensor-id"]).get_indexer(ids.cat.categories), -1
+        )
+        codes = codes[ids.cat.codes.to_numpy()]
+    else:
+        codes = pd.Index(sensors["sensor-id"]).get_indexer(ids)
+    known = codes >= 0
+    return (
+        df[known]
+        .reset_index(drop=True)
+        .assign(
+            **{
+                column: sensors[column].to_numpy()[codes[known]]
+                for column in sensors.columns.drop("sensor-id")
+            }
+        )
+    )
+
+
+def readSensors() -> pd.DataFrame:
+    """Reads details of each sensor (name, location and max water level) from floodmax/sensors.csv."""
+    sensorPath = os.path.abspath(os.path.join(__file__, "../floodmax/sensors.csv"))
+    return pd.read_csv(sensorPath)
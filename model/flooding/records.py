@@ -0,0 +1,62 @@
+# Parsing of flood payloads into plain records, importing nothing outside the standard library
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+FIELDS = [
+    "timestamp",
+    "sensor-id",
+    "water-level",
+    "status",
+]  # Fields of a stored reading
+RETENTION = timedelta(days=731)  # How long readings are kept for before expiring
+ROLLUPS = {"1h": "hour", "1d": "day"}  # Resolutions of rollups, and the unit of each
+STATUSES = [0, 1, 2, 3]  # Statuses reported by sensors, counted in rollups
+
+
+def splitRecords(raw: str):
+    """
+    Splits a raw payload from the API into records of 7 fields
+    (sensor-id, sensor-name, longitude, latitude, water-level, status, timestamp), skipping malformed and duplicate records.
+    """
+    seen = set()
+    for sensor in raw.split("$#$$@$"):
+        record = tuple(sensor.split("$#$"))
+        if len(record) != 7 or record in seen:
+            continue
+        seen.add(record)
+        yield record
+
+
+def parseReadings(raw: str) -> list[dict]:
+    """
+    Parses a raw payload from the API into readings ready to be stored, as dicts of FIELDS.
+    """
+    return [
+        {
+            "timestamp": parseTimestamp(record[6]),
+            "sensor-id": record[0],
+            "water-level": float(record[4]),
+            "status": int(record[5]),
+        }
+        for record in splitRecords(raw)
+    ]
+
+
+@lru_cache(maxsize=1024)
+def parseTimestamp(timestamp: str):
+    """
+    Parses flood observation timestamps, accounting for possible errors/format issues.\n
+    Results are cached, as records in a payload share only a few timestamps.
+    """
+    # Standardise timestamp, zero pad all
+    timestamp = timestamp.split(" ")
+    while "" in timestamp:
+        timestamp.remove("")
+    # Pad day
+    if len(timestamp[1]) < 2:
+        timestamp[1] = "0" + timestamp[1]
+    # Pad time
+    if len(timestamp[-1].split(":")[0]) < 2:
+        timestamp[-1] = "0" + timestamp[-1]
+    timestamp = " ".join(timestamp)
+    return datetime.strptime(timestamp, "%b %d %Y  %I:%M%p")
@@ -0,0 +1,313 @@
+# Storage backends for flooding readings, so the pipeline can run against MongoDB or a local database
+import os, sqlite3, pandas as pd
+from abc import ABC, abstractmethod
+from contextlib import closing
+from datetime import datetime, timedelta
+from dotenv import load_dotenv, find_dotenv
+
+try:
+    from .myutils import emptyReadings, emptyRollups, ROLLUPCOLUMNS
+    from .records import RETENTION, STATUSES
+except:
+    from myutils import emptyReadings, emptyRollups, ROLLUPCOLUMNS
+    from records import RETENTION, STATUSES
+ROLLUPPERIODS = {
+    "1h": "strftime('%Y-%m-%d %H:00:00', timestamp)",
+    "1d": "strftime('%Y-%m-%d 00:00:00', timestamp)",
+}  # SQLite expressions for the start of the period holding each reading, at each resolution of ROLLUPS
+DEFAULTPATH = os.path.abspath(
+    os.path.join(__file__, "../../data/flooding/floods.db")
+)  # Embedded database used when FLOOD_STORE is sqlite, shared with FloodMirror
+
+
+class FloodStore(ABC):
+    """
+    Interface for storing flooding readings (timestamp, sensor-id, water-level and status),
+    each identified by its (sensor-id, timestamp) key.\n
+    Backends must implement every method, so one missing a method fails when it is created.
+    """
+
+    @abstractmethod
+    def save(self, data: pd.DataFrame) -> int:
+        """
+        Saves readings, skipping those already stored, and updates the rollups of the days saved.
+        Returns the number of readings saved.
+        """
+
+    @abstractmethod
+    def fetchRange(
+        self, start: datetime = None, end: datetime = None, statuses: list = None
+    ) -> pd.DataFrame:
+        """
+        Fetches readings from start (inclusive) to end (exclusive), both optional,
+        optionally only those with given statuses. Readings are ordered by timestamp.
+        """
+
+    @abstractmethod
+    def dedupe(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Returns the readings that are not already stored."""
+
+    @abstractmethod
+    def expire(self, retention: timedelta = RETENTION) -> int:
+        """Deletes readings older than retention. Returns the number of readings deleted."""
+
+    @abstractmethod
+    def updateRollups(self, start: datetime = None, end: datetime = None):
+        """
+        Recalculates hourly and daily rollups of every sensor over the days from start to end (both optional),
+        from the readings stored. Rollups hold the number of readings, mean, max and min water levels
+        and the number of readings with each status.
+        """
+
+    @abstractmethod
+    def fetchRollups(
+        self,
+        resolution: str = "1h",
+        start: datetime = None,
+        end: datetime = None,
+        sensors: list = None,
+    ) -> pd.DataFrame:
+        """
+        Fetches rollups at a resolution (1h or 1d) for periods starting from start (inclusive) to end (exclusive),
+        optionally only for some sensors. Use flooding.addRollupDetails to convert water levels to % full.
+        """
+
+
+class MongoFloodStore(FloodStore):
+    """
+    Readings kept in the MongoDB database at MONGODB_URI, through the functions in flooding.db.
+    pymongo is only imported once this store is created.
+    """
+
+    def __init__(self):
+        try:
+            from . import db
+        except:
+            import db
+        self.db = db
+
+    def save(self, data: pd.DataFrame) -> int:
+        saved = self.db.saveToDatabase(data)
+        if saved:
+            timestamps = pd.to_datetime(data["timestamp"])
+            self.updateRollups(timestamps.min(), timestamps.max())
+        return saved
+
+    def fetchRange(
+        self, start: datetime = None, end: datetime = None, statuses: list = None
+    ) -> pd.DataFrame:
+        query = {}
+        if start is not None or end is not None:
+            query["timestamp"] = {}
+            if start is not None:
+                query["timestamp"]["$gte"] = start
+            if end is not None:
+                query["timestamp"]["$lt"] = end
+        if statuses is not None:
+            query["status"] = {"$in": list(statuses)}
+        chunks = list(self.db.streamFromDatabase(query))
+        if not chunks:
+            return emptyReadings()
+        floodDf = pd.concat(chunks, ignore_index=True)
+        return floodDf.sort_values(by="timestamp").reset_index(drop=True)
+
+    def dedupe(self, data: pd.DataFrame) -> pd.DataFrame:
+        return self.db.deleteDuplicates(data)
+
+    def expire(self, retention: timedelta = RETENTION) -> int:
+        """
+        Deletes readings older than retention. The TTL index created on saves normally does this in the background.
+        """
+        collection = self.db.getClient().floodData.floodData
+        result = collection.delete_many(
+            {"timestamp": {"$lt": datetime.now() - retention}}
+        )
+        return result.deleted_count
+
+    def updateRollups(self, start: datetime = None, end: datetime = None):
+        self.db.updateRollups(start, end)
+
+    def fetchRollups(
+        self,
+        resolution: str = "1h",
+        start: datetime = None,
+        end: datetime = None,
+        sensors: list = None,
+    ) -> pd.DataFrame:
+        return self.db.fetchRollups(resolution, start, end, sensors)
+
+
+class SQLiteFloodStore(FloodStore):
+    """
+    Readings kept in an SQLite database file, in a table keyed on (sensor-id, timestamp)
+    with an index on timestamp for range queries. Needs no network access.
+
+    Parameters
+    ----------
+    `path`: Path of the database file, created if missing
+    """
+
+    def __init__(self, path: str = DEFAULTPATH):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS readings (
+                    "sensor-id" TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    "water-level" REAL,
+                    status INTEGER,
+                    PRIMARY KEY ("sensor-id", timestamp)
+                ) WITHOUT ROWID""")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS readingTimes ON readings (timestamp)"
+            )
+            connection.execute(f"""CREATE TABLE IF NOT EXISTS rollups (
+                    resolution TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    "sensor-id" TEXT NOT NULL,
+                    readings INTEGER,
+                    "mean-water-level" REAL,
+                    "max-water-level" REAL,
+                    "min-water-level" REAL,
+                    {", ".join(f'"status-{status}" INTEGER' for status in STATUSES)},
+                    PRIMARY KEY (resolution, timestamp, "sensor-id")
+                ) WITHOUT ROWID""")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections are opened per call, so a store can be used from any thread
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _timestamps(timestamps) -> list[str]:
+        # Timestamps are kept as ISO strings, which order the same as the times they hold
+        return pd.to_datetime(timestamps).dt.strftime("%Y-%m-%d %H:%M:%S").tolist()
+
+    def save(self, data: pd.DataFrame) -> int:
+        rows = zip(
+            data["sensor-id"].tolist(),
+            self._timestamps(data["timestamp"]),
+            data["water-level"].astype(float).tolist(),
+            data["status"].astype(int).tolist(),
+        )
+        with closing(self._connect()) as connection, connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO readings VALUES (?, ?, ?, ?)", rows
+            )
+            saved = connection.total_changes - before
+        if saved:
+            timestamps = pd.to_datetime(data["timestamp"])
+            self.updateRollups(timestamps.min(), timestamps.max())
+        return saved
+
+    def fetchRange(
+        self, start: datetime = None, end: datetime = None, statuses: list = None
+    ) -> pd.DataFrame:
+        conditions, parameters = [], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            parameters.append(pd.Timestamp(start).strftime("%Y-%m-%d %H:%M:%S"))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            parameters.append(pd.Timestamp(end).strftime("%Y-%m-%d %H:%M:%S"))
+        if statuses is not None:
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+            parameters.extend(int(status) for status in statuses)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with closing(self._connect()) as connection:
+            floodDf = pd.read_sql_query(
+                f'SELECT timestamp, "sensor-id", "water-level", status FROM readings {where} ORDER BY timestamp',
+                connection,
+                params=parameters,
+            )
+        if floodDf.empty:
+            return emptyReadings()
+        floodDf["timestamp"] = pd.to_datetime(floodDf["timestamp"], format="ISO8601")
+        floodDf["status"] = floodDf["status"].astype("int8")
+        return floodDf
+
+    def dedupe(self, data: pd.DataFrame) -> pd.DataFrame:
+        timestamps = self._timestamps(data["timestamp"])
+        with closing(self._connect()) as connection:
+            # Look up keys only within the time range of the given readings
+            existing = connection.execute(
+                'SELECT "sensor-id", timestamp FROM readings WHERE timestamp BETWEEN ? AND ?',
+                (min(timestamps, default=""), max(timestamps, default="")),
+            ).fetchall()
+        keys = pd.MultiIndex.from_arrays([data["sensor-id"].tolist(), timestamps])
+        return data[~keys.isin(existing)]
+
+    def expire(self, retention: timedelta = RETENTION) -> int:
+        threshold = (datetime.now() - retention).strftime("%Y-%m-%d %H:%M:%S")
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                "DELETE FROM readings WHERE timestamp < ?", (threshold,)
+            )
+            return cursor.rowcount
+
+    def updateRollups(self, start: datetime = None, end: datetime = None):
+        # Cover whole days, so that the first and last periods are calculated from all of their readings
+        conditions, parameters = [], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            parameters.append(pd.Timestamp(start).strftime("%Y-%m-%d 00:00:00"))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            parameters.append(
+                (pd.Timestamp(end) + timedelta(days=1)).strftime("%Y-%m-%d 00:00:00")
+            )
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        statusCounts = ", ".join(f"SUM(status = {status})" for status in STATUSES)
+        with closing(self._connect()) as connection, connection:
+            for resolution, period in ROLLUPPERIODS.items():
+                connection.execute(
+                    f"""INSERT OR REPLACE INTO rollups
+                    SELECT ?, {period} AS period, "sensor-id", COUNT(*), AVG("water-level"),
+                        MAX("water-level"), MIN("water-level"), {statusCounts}
+                    FROM readings {where} GROUP BY period, "sensor-id"
+                    """,
+                    [resolution, *parameters],
+                )
+
+    def fetchRollups(
+        self,
+        resolution: str = "1h",
+        start: datetime = None,
+        end: datetime = None,
+        sensors: list = None,
+    ) -> pd.DataFrame:
+        conditions, parameters = ["resolution = ?"], [resolution]
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            parameters.append(pd.Timestamp(start).strftime("%Y-%m-%d %H:%M:%S"))
+        if end is not None:
+            conditions.append("timestamp < ?")
+            parameters.append(pd.Timestamp(end).strftime("%Y-%m-%d %H:%M:%S"))
+        if sensors is not None:
+            conditions.append(f'"sensor-id" IN ({", ".join("?" * len(sensors))})')
+            parameters.extend(sensors)
+        columns = ", ".join(f'"{column}"' for column in ROLLUPCOLUMNS)
+        with closing(self._connect()) as connection:
+            rollupDf = pd.read_sql_query(
+                f"SELECT {columns} FROM rollups WHERE {' AND '.join(conditions)} ORDER BY timestamp, \"sensor-id\"",
+                connection,
+                params=parameters,
+            )
+        if rollupDf.empty:
+            return emptyRollups()
+        rollupDf["timestamp"] = pd.to_datetime(rollupDf["timestamp"], format="ISO8601")
+        return rollupDf
+
+
+def getStore() -> FloodStore:
+    """
+    Gets the store set by the FLOOD_STORE environment variable: mongodb (the default) or sqlite.
+    The sqlite store is kept at FLOOD_STORE_PATH, or DEFAULTPATH if that is not set.
+    """
+    load_dotenv(find_dotenv())
+    kind = os.environ.get("FLOOD_STORE", "mongodb").lower()
+    if kind == "mongodb":
+        return MongoFloodStore()
+    if kind == "sqlite":
+        return SQLiteFloodStore(os.environ.get("FLOOD_STORE_PATH", DEFAULTPATH))
+    raise ValueError(f"Unknown flood store {kind}, expected mongodb or sqlite")
@@ -0,0 +1,105 @@
+# Manifest of the days of each data source that are cached locally
+import os, json, uuid, numpy as np
+from datetime import date, timedelta
+
+
+class RangeManifest:
+    """
+    Record of which days of each data source (e.g. flooding, weather) are fully cached locally,
+    kept as a JSON file of merged (start, end) day intervals per source.\n
+    Only days recorded as complete are skipped when fetching, so a day still in progress is fetched again.
+
+    Parameters
+    ----------
+    `path`: Path of the JSON file holding the manifest, created when first written
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.sources = {}
+        if os.path.isfile(self.path):
+            with open(self.path) as file:
+                self.sources = {
+                    source: [
+                        (date.fromisoformat(start), date.fromisoformat(end))
+                        for start, end in intervals
+                    ]
+                    for source, intervals in json.load(file).items()
+                }
+
+    def __contains__(self, source: str) -> bool:
+        return source in self.sources
+
+    def intervals(self, source: str) -> list[tuple[date, date]]:
+        """Returns the intervals of days (start and end inclusive) cached for a source, in order."""
+        return list(self.sources.get(source, []))
+
+    def missing(
+        self, source: str, startDate: date, endDate: date
+    ) -> list[tuple[date, date]]:
+        """
+        Returns the fewest intervals of days (start and end inclusive) covering every day
+        from startDate to endDate that is not cached for a source.
+        """
+        missing = []
+        current = startDate
+        for start, end in self.sources.get(source, []):
+            if end < current:
+                continue
+            if start > endDate:
+                break
+            if start > current:
+                missing.append((current, start - timedelta(days=1)))
+            current = max(current, end + timedelta(days=1))
+        if current <= endDate:
+            missing.append((current, endDate))
+        return missing
+
+    def covers(self, source: str, startTimes, endTimes) -> np.ndarray:
+        """
+        Checks many spans of time at once, returning a mask of the spans (from startTimes to endTimes)
+        whose every day is cached for a source.
+        """
+        startDays = np.asarray(startTimes, dtype="datetime64[D]")
+        endDays = np.asarray(endTimes, dtype="datetime64[D]")
+        covered = np.zeros(len(startDays), dtype=bool)
+        # Intervals are merged, so a covered span lies within a single interval
+        for start, end in self.sources.get(source, []):
+            covered |= (startDays >= np.datetime64(start)) & (
+                endDays <= np.datetime64(end)
+            )
+        return covered
+
+    def add(self, source: str, startDate: date, endDate: date):
+        """
+        Records the days from startDate to endDate (inclusive) as cached for a source, and saves the manifest.
+        """
+        if startDate > endDate:
+            return
+        intervals = sorted(self.sources.get(source, []) + [(startDate, endDate)])
+        merged = [intervals[0]]
+        for start, end in intervals[1:]:
+            # Merge intervals that overlap or touch
+            if start <= merged[-1][1] + timedelta(days=1):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self.sources[source] = merged
+        self.save()
+
+    def save(self):
+        """Writes the manifest, replacing the file in one step so it is never left partly written."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporaryPath = f"{self.path}.{uuid.uuid4().hex}"
+        with open(temporaryPath, "w") as file:
+            json.dump(
+                {
+                    source: [
+                        [start.isoformat(), end.isoformat()] for start, end in intervals
+                    ]
+                    for source, intervals in self.sources.items()
+                },
+                file,
+                indent=2,
+            )
+        os.replace(temporaryPath, self.path)
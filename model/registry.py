@@ -0,0 +1,120 @@
+# Registry of stable integer codes for sensor and weather station ids
+import os, json, uuid, numpy as np, pandas as pd
+from contextlib import contextmanager
+
+SENSORPATH = os.path.abspath(os.path.join(__file__, "../flooding/floodmax/sensors.csv"))
+KINDS = {"sensor-id": "sensors", "station-id": "stations"}  # Kind of id in each column
+
+
+@contextmanager
+def fileLock(path: str):
+    """
+    Holds an exclusive lock on a file (created if missing) until the block exits, blocking while another process holds it.
+    """
+    with open(path, "a+") as file:
+        if os.name == "nt":
+            import msvcrt
+
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class IdRegistry:
+    """
+    Maps sensor and weather station ids to small integers that never change, kept in a JSON file.\n
+    Sensors are registered in the order of floodmax/sensors.csv, and any other id is appended when first encoded,
+    so codes are never reused or reordered. Encoded columns are categoricals whose codes are the registry's codes,
+    so joins, group-bys and lookups on them run on integers, and arrays indexed by code need no lookup.
+    Registering holds a lock on the file, so processes appending at once never give one code to two ids.
+
+    Parameters
+    ----------
+    `path`: Path of the JSON file holding the registry, created when first written
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.registered = {kind: [] for kind in KINDS.values()}
+        self.indexes = {}
+        self._load()
+        # Register sensors added to sensors.csv since the registry was saved
+        self.register("sensors", pd.read_csv(SENSORPATH)["sensor-id"])
+
+    def _load(self):
+        if os.path.isfile(self.path):
+            with open(self.path) as file:
+                self.registered.update(json.load(file))
+            self.indexes = {}
+
+    def ids(self, kind: str) -> pd.Index:
+        """Returns the registered ids of a kind ("sensors" or "stations"), in the order of their codes."""
+        if kind not in self.indexes:
+            self.indexes[kind] = pd.Index(self.registered[kind], dtype=object)
+        return self.indexes[kind]
+
+    def dtype(self, kind: str) -> pd.CategoricalDtype:
+        """Returns the categorical type of encoded ids of a kind, whose codes are the registry's codes."""
+        return pd.CategoricalDtype(self.ids(kind))
+
+    def register(self, kind: str, ids):
+        """
+        Registers ids of a kind not yet in the registry, saving the registry if any are new.
+        The registry is read again under the lock first, so ids registered by other processes keep their codes.
+        """
+        ids = pd.unique(pd.Series(ids, dtype=object).dropna().astype(str))
+        if not (self.ids(kind).get_indexer(ids) < 0).any():
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with fileLock(f"{self.path}.lock"):
+            self._load()
+            new = ids[self.ids(kind).get_indexer(ids) < 0]
+            if len(new):
+                self.registered[kind] += new.tolist()
+                self.indexes.pop(kind, None)
+                self.save()
+
+    def encode(self, kind: str, ids) -> np.ndarray:
+        """
+        Encodes an array of ids of a kind as their codes (-1 for missing ids), registering ids not yet in the registry.
+        Ids already of a type from dtype() are encoded by their codes (as codes are never reordered, whenever the type
+        was taken), and other categoricals are encoded once per category.
+        """
+        ids = pd.Series(ids, copy=False)
+        if isinstance(ids.dtype, pd.CategoricalDtype):
+            categories = ids.cat.categories
+            if categories.equals(self.ids(kind)[: len(categories)]):
+                return ids.cat.codes.to_numpy()
+            categories = categories.astype(str)
+            self.register(kind, categories)
+            codes = np.append(self.ids(kind).get_indexer(categories), -1)
+            return codes[ids.cat.codes.to_numpy()]
+        self.register(kind, ids)
+        return self.ids(kind).get_indexer(ids.astype(str).where(ids.notna()))
+
+    def decode(self, kind: str, codes) -> np.ndarray:
+        """Decodes an array of codes of a kind back to ids (None for -1)."""
+        return np.append(self.ids(kind).to_numpy(), None)[np.asarray(codes)]
+
+    def categorical(self, kind: str, ids) -> pd.Categorical:
+        """Encodes an array of ids of a kind as a categorical of the registry's type."""
+        return pd.Categorical.from_codes(self.encode(kind, ids), dtype=self.dtype(kind))
+
+    def save(self):
+        """Writes the registry, replacing the file in one step so it is never left partly written."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporaryPath = f"{self.path}.{uuid.uuid4().hex}"
+        with open(temporaryPath, "w") as file:
+            json.dump(self.registered, file, indent=2)
+        os.replace(temporaryPath, self.path)
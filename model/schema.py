@@ -0,0 +1,105 @@
+# Compact column types for the data_gen pipeline, with names kept in side tables
+import numpy as np, pandas as pd
+from weather import WEATHER_TYPES
+from registry import IdRegistry, KINDS
+
+# Types of columns in flooding data (as returned by getAllData)
+FLOOD_SCHEMA = {
+    "sensor-id": "category",
+    "sensor-name": "category",
+    "latitude": np.float32,
+    "longitude": np.float32,
+    "max-level": np.float32,
+    "% full": np.float32,
+    "status": np.int8,
+}
+# Types of columns in weather data (as returned by getAllData)
+WEATHER_SCHEMA = {
+    "station-id": "category",
+    "station-name": "category",
+    "latitude": np.float32,
+    "longitude": np.float32,
+    **{type: np.float32 for type in WEATHER_TYPES},
+}
+
+
+def compact(df: pd.DataFrame, types: dict, registry: IdRegistry = None) -> pd.DataFrame:
+    """
+    Converts the columns of a dataframe which are in types (and present) to their compact types,
+    and parses timestamps stored as strings. Columns already of the right type are not copied.\n
+    If a registry is given, sensor and station ids are encoded with the registry's codes.
+    """
+    types = {
+        column: type
+        for column, type in types.items()
+        if column in df.columns and df[column].dtype != type
+    }
+    ids = {}
+    if registry is not None:
+        for column, kind in KINDS.items():
+            types.pop(column, None)
+            if column in df.columns and df[column].dtype != registry.dtype(kind):
+                ids[column] = registry.categorical(kind, df[column])
+    if types:
+        df = df.astype(types, copy=False)
+    if ids:
+        # Encoded ids replace their columns, keeping the others rather than copying them
+        df = pd.DataFrame(
+            {column: ids.get(column, df[column]) for column in df.columns},
+            index=df.index,
+            copy=False,
+        )
+    if "timestamp" in df.columns and df["timestamp"].dtype == object:
+        df = df.assign(timestamp=pd.to_datetime(df["timestamp"]))
+    return df
+
+
+def splitNames(
+    df: pd.DataFrame, idColumn: str, nameColumn: str
+) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    Removes a column of names from a dataframe, returning the dataframe and a side table
+    (a series of names indexed by id) holding each name once.
+    """
+    names = (
+        df[[idColumn, nameColumn]]
+        .drop_duplicates(subset=idColumn)
+        .dropna(subset=idColumn)
+        .set_index(idColumn)[nameColumn]
+    )
+    names.index = names.index.astype(str)
+    # Other columns are kept rather than copied (as drop would copy the whole dataframe)
+    df = pd.DataFrame(
+        {column: df[column] for column in df.columns if column != nameColumn},
+        copy=False,
+    )
+    return df, names.astype(str)
+
+
+def lookupNames(ids: pd.Series, names: pd.Series) -> pd.Categorical:
+    """
+    Looks up the name of each id in a side table from splitNames, returning the names as a categorical.
+    """
+    if isinstance(ids.dtype, pd.CategoricalDtype):
+        # Look names up once per category, rather than once per row
+        nameCodes, nameCategories = pd.factorize(
+            names.reindex(ids.cat.categories.astype(str))
+        )
+        codes = ids.cat.codes.to_numpy()
+        return pd.Categorical.from_codes(
+            np.where(codes >= 0, nameCodes[codes], -1), categories=nameCategories
+        )
+    return pd.Categorical(ids.astype(str).map(names))
+
+
+def positions(ids: pd.Series, keys: pd.Series) -> np.ndarray:
+    """
+    Returns the position of each id in keys, which should be unique (-1 if not present).
+    Ids and keys of the same categorical type are matched by indexing on their codes, rather than by hashing each id.
+    """
+    if isinstance(ids.dtype, pd.CategoricalDtype) and ids.dtype == keys.dtype:
+        lookup = np.full(len(ids.dtype.categories) + 1, -1, dtype=np.int64)
+        keyCodes = keys.cat.codes.to_numpy()
+        lookup[keyCodes[keyCodes >= 0]] = np.flatnonzero(keyCodes >= 0)
+        return lookup[ids.cat.codes.to_numpy()]
+    return pd.Index(keys).get_indexer(ids)
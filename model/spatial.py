@@ -0,0 +1,325 @@
+# Spatial lookups between flood sensors and weather stations
+import numpy as np, pandas as pd
+from geopy.distance import geodesic
+from sklearn.neighbors import BallTree
+from schema import positions
+
+CANDIDATES = 3  # Extra stations checked with geodesic distance, as haversine can misorder close stations
+EARTHRADIUS = 6371.0088  # Mean radius of the earth (in km), for haversine distances
+CHUNKSIZE = 10_000  # Pairs checked at once, bounding (pair x station) arrays
+MINDISTANCE = 0.01  # Distance (in km) below which a station is weighted as if it were this distance away
+
+
+class StationIndex:
+    """
+    Spatial index over weather stations, for finding the stations closest to many points at once.\n
+    Candidate stations are found with a haversine ball tree, and distances are then calculated as
+    geodesic distances (in km), so they match geopy.distance.geodesic.
+
+    Parameters
+    ----------
+    `latitudes`: Latitudes of stations\n
+    `longitudes`: Longitudes of stations
+    """
+
+    def __init__(self, latitudes, longitudes):
+        self.coords = np.column_stack(
+            [
+                np.asarray(latitudes, dtype=np.float64),
+                np.asarray(longitudes, dtype=np.float64),
+            ]
+        )
+        self.tree = BallTree(np.radians(self.coords), metric="haversine")
+
+    def nearest(
+        self, latitudes, longitudes, k: int = 1, exact: int = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k closest stations to each point, returning a tuple of (distances, indices),
+        each an array of shape (points, k) ordered from closest to furthest.\n
+        Only the closest exact stations (all k if not given, plus CANDIDATES) are ordered and measured by geodesic distance,
+        the rest are ordered and measured by haversine distance (within about 0.5%), so ranking every station stays cheap.
+        """
+        points = np.column_stack(
+            [
+                np.asarray(latitudes, dtype=np.float64),
+                np.asarray(longitudes, dtype=np.float64),
+            ]
+        )
+        exact = k if exact is None else min(exact, k)
+        numChecked = min(exact + CANDIDATES, len(self.coords))
+        distances, candidates = self.tree.query(
+            np.radians(points), k=max(k, numChecked)
+        )
+        distances *= EARTHRADIUS
+
+        # Order the closest candidates by geodesic distance
+        checked = np.array(
+            [
+                [
+                    geodesic(point, self.coords[station]).kilometers
+                    for station in pointCandidates[:numChecked]
+                ]
+                for point, pointCandidates in zip(points, candidates)
+            ]
+        ).reshape(len(points), numChecked)
+        order = np.argsort(checked, axis=1, kind="stable")
+        distances[:, :numChecked] = np.take_along_axis(checked, order, axis=1)
+        candidates[:, :numChecked] = np.take_along_axis(
+            candidates[:, :numChecked], order, axis=1
+        )
+        return distances[:, :k], candidates[:, :k]
+
+    def distances(self, latitudes, longitudes, stations) -> np.ndarray:
+        """
+        Calculates the geodesic distance (in km) from each point to a station (given by its index),
+        for measuring stations found beyond the exact ones returned by nearest.
+        """
+        return np.array(
+            [
+                geodesic(point, self.coords[station]).kilometers
+                for point, station in zip(zip(latitudes, longitudes), stations)
+            ],
+            dtype=np.float64,
+        )
+
+
+class StationAvailability:
+    """
+    Index of the periods in which each weather station was recording, derived from weather data.\n
+    A station's readings form one active interval until two consecutive readings are more than maxGap apart.
+    Time is split into buckets, and a station is available in a bucket if any of its active intervals overlaps it.
+
+    Parameters
+    ----------
+    `weatherDf`: Weather data (as returned by getAllData)\n
+    `stations`: Station ids, in the order used for station positions in the index\n
+    `bucketSize`: Length of each time bucket\n
+    `maxGap`: Longest time between readings of a station for it to still be considered recording
+    """
+
+    def __init__(
+        self,
+        weatherDf: pd.DataFrame,
+        stations,
+        bucketSize: str = "1h",
+        maxGap: str = "1h",
+    ):
+        self.stations = pd.Index(stations)
+        self.bucketSize = pd.Timedelta(bucketSize).value
+        # Stations of the id registry's type are positioned by their codes, rather than by hashing each id
+        codes = positions(weatherDf["station-id"], pd.Series(self.stations))
+        times = pd.to_datetime(weatherDf["timestamp"]).to_numpy("datetime64[ns]")
+        times = times.view(np.int64)[codes >= 0]
+        codes = codes[codes >= 0]
+
+        # Split each station's readings into intervals wherever the station stops recording
+        order = np.lexsort((times, codes))
+        codes, times = codes[order], times[order]
+        newInterval = np.ones(len(times), dtype=bool)
+        newInterval[1:] = (codes[1:] != codes[:-1]) | (
+            np.diff(times) > pd.Timedelta(maxGap).value
+        )
+        startIndices = np.flatnonzero(newInterval)
+        endIndices = np.append(startIndices[1:], len(times))[: len(startIndices)] - 1
+        self.intervals = pd.DataFrame(
+            {
+                "station-id": self.stations[codes[startIndices]],
+                "start": pd.to_datetime(times[startIndices]),
+                "end": pd.to_datetime(times[endIndices]),
+            }
+        )
+
+        # Mark buckets covered by each interval, by counting interval starts and ends through time
+        self.origin = (
+            int(times.min()) // self.bucketSize * self.bucketSize if len(times) else 0
+        )
+        numBuckets = (
+            (int(times.max()) - self.origin) // self.bucketSize + 1 if len(times) else 0
+        )
+        startBuckets = (times[startIndices] - self.origin) // self.bucketSize
+        endBuckets = (times[endIndices] - self.origin) // self.bucketSize
+        changes = np.zeros((numBuckets + 1, len(self.stations)), dtype=np.int32)
+        np.add.at(changes, (startBuckets, codes[startIndices]), 1)
+        np.add.at(changes, (endBuckets + 1, codes[startIndices]), -1)
+        self.available = np.cumsum(changes, axis=0)[:-1] > 0
+
+    def buckets(self, times) -> np.ndarray:
+        """
+        Gets the bucket of each time, with -1 for times outside of all buckets.
+        """
+        times = (
+            pd.to_datetime(np.asarray(times)).to_numpy("datetime64[ns]").view(np.int64)
+        )
+        buckets = (times - self.origin) // self.bucketSize
+        return np.where((buckets >= 0) & (buckets < len(self.available)), buckets, -1)
+
+
+def availableStations(
+    sensorCodes: np.ndarray,
+    times,
+    rankings: np.ndarray,
+    availability: StationAvailability,
+    k: int = 1,
+) -> np.ndarray:
+    """
+    Finds the k closest stations available to each (sensor, time) pair, returning the ranks of those stations
+    among the sensor's stations as an array of shape (pairs, k), from closest to furthest (-1 where fewer than k
+    stations are available). Resolved once per (sensor, time bucket).
+
+    Parameters
+    ----------
+    `sensorCodes`: Position of each pair's sensor in rankings\n
+    `times`: Time of each pair\n
+    `rankings`: Station positions (in availability) for each sensor, from closest to furthest, as given by StationIndex.nearest\n
+    `availability`: Index of when stations were recording\n
+    `k`: Number of stations to find for each pair
+    """
+    if not availability.available.size or not rankings.shape[1]:
+        # No weather was recorded, so no station is available
+        return np.full((len(sensorCodes), k), -1, dtype=np.int64)
+    buckets = availability.buckets(times)
+    # Find unique pairs as single integers (shifting buckets by one for -1), which is cheaper than unique rows
+    numBuckets = len(availability.available) + 1
+    pairs, inverse = np.unique(
+        np.asarray(sensorCodes, dtype=np.int64) * numBuckets + (buckets + 1),
+        return_inverse=True,
+    )
+    pairSensors, pairBuckets = np.divmod(pairs, numBuckets)
+    pairBuckets -= 1
+    # Check availability of every station for a chunk of pairs at once, in order of distance
+    ranks = np.empty((len(pairs), k), dtype=np.int64)
+    for start in range(0, len(pairs), CHUNKSIZE):
+        chunk = slice(start, start + CHUNKSIZE)
+        available = availability.available[
+            pairBuckets[chunk, None], rankings[pairSensors[chunk]]
+        ]
+        available &= (pairBuckets[chunk] >= 0)[:, None]
+        # The n-th available station is where the running count of available stations first reaches n
+        counts = np.cumsum(available, axis=1)
+        for n in range(k):
+            nth = available & (counts == n + 1)
+            ranks[chunk, n] = np.where(nth.any(axis=1), nth.argmax(axis=1), -1)
+    return ranks[inverse.ravel()]
+
+
+def closestAvailableStations(
+    sensorCodes: np.ndarray,
+    times,
+    rankings: np.ndarray,
+    availability: StationAvailability,
+) -> np.ndarray:
+    """
+    Finds the closest station available to each (sensor, time) pair, returning the rank of that station
+    among the sensor's stations (-1 if no station is available), as availableStations does with k of 1.
+    """
+    return availableStations(sensorCodes, times, rankings, availability)[:, 0]
+
+
+class WeightedStations:
+    """
+    Inverse distance weights for interpolating weather at each sensor from the k closest stations recording at the time.\n
+    Stations are ranked by distance from each sensor once, and the k closest available are chosen per (sensor, time bucket)
+    from availability, so a station that is offline is replaced by the next closest station recording.
+    Stations without readings in a window are still left out, with the remaining weights rescaled to sum to 1.
+
+    Parameters
+    ----------
+    `sensors`: Dataframe of sensor-id, latitude and longitude for each sensor\n
+    `stations`: Dataframe of station-id, latitude and longitude for each station\n
+    `k`: Number of closest stations to interpolate from\n
+    `power`: Power of distance that weights are inversely proportional to\n
+    `availability`: Index of when stations were recording, over stations in the order given (all stations are taken as available if not given)
+    """
+
+    def __init__(
+        self,
+        sensors: pd.DataFrame,
+        stations: pd.DataFrame,
+        k: int = 3,
+        power: int = 2,
+        availability: StationAvailability = None,
+    ):
+        self.sensors = sensors["sensor-id"].reset_index(drop=True)
+        self.stations = pd.Index(stations["station-id"])
+        self.k = min(k, len(stations))
+        self.power = power
+        self.availability = availability
+        # Rank every station when choosing by availability, as the closest k may all be offline
+        self.distances, self.rankings = StationIndex(
+            stations["latitude"], stations["longitude"]
+        ).nearest(
+            sensors["latitude"],
+            sensors["longitude"],
+            k=len(stations) if availability else self.k,
+            exact=self.k,
+        )
+
+    def neighbours(
+        self, sensorCodes: np.ndarray, times
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the stations to interpolate from for each (sensor, time) pair, returning a tuple of (stations, weights),
+        each an array of shape (pairs, k), with stations as positions in self.stations (-1 and a weight of 0 where
+        fewer than k stations are available).
+        """
+        if self.availability:
+            ranks = availableStations(
+                sensorCodes, times, self.rankings, self.availability, self.k
+            )
+        else:
+            ranks = np.broadcast_to(np.arange(self.k), (len(sensorCodes), self.k))
+        found = ranks >= 0
+        sensorCodes, ranks = sensorCodes[:, None], np.maximum(ranks, 0)
+        stations = np.where(found, self.rankings[sensorCodes, ranks], -1)
+        distances = np.maximum(self.distances[sensorCodes, ranks], MINDISTANCE)
+        return stations, np.where(found, 1 / distances**self.power, 0)
+
+    def query(
+        self,
+        grid,
+        sensorIds,
+        times,
+        interval,
+        chunkSize: int = CHUNKSIZE,
+        dtype=np.float64,
+    ) -> np.ndarray:
+        """
+        Calculates interpolated weather at many (sensor, time) pairs at once, returning a matrix
+        with one row per pair and one column per weather type (as WeatherGrid.query does).
+
+        Parameters
+        ----------
+        `grid`: WeatherGrid to take weather at stations from\n
+        `sensorIds`: Array of sensor ids\n
+        `times`: Array of times, at the center of each window\n
+        `interval`: Length of each window in minutes\n
+        `chunkSize`: Number of pairs whose weather is calculated at once\n
+        `dtype`: Type of the matrix returned (weather is always calculated in float64)
+        """
+        # Sensors and stations of the id registry's type are positioned by their codes, rather than by hashing each id
+        sensorCodes = positions(pd.Series(sensorIds, copy=False), self.sensors)
+        times = pd.to_datetime(np.asarray(times)).to_numpy("datetime64[ns]")
+        # Position of each station in the grid, with -1 left for missing stations
+        gridCodes = np.append(grid.codes(self.stations), -1)
+        weather = np.full((len(sensorCodes), grid.sums.shape[-1]), np.nan, dtype=dtype)
+
+        known = np.flatnonzero(sensorCodes >= 0)
+        for start in range(0, len(known), chunkSize):
+            rows = known[start : start + chunkSize]
+            stations, weights = self.neighbours(sensorCodes[rows], times[rows])
+            # Weather at each pair's stations, as a (pair x station x type) array
+            stationWeather = grid.queryCodes(
+                gridCodes[stations].ravel(),
+                np.repeat(times[rows].view(np.int64), self.k),
+                interval,
+            ).reshape(len(rows), self.k, -1)
+            present = ~np.isnan(stationWeather)
+            weights = np.where(present, weights[:, :, None], 0)
+            totals = (np.where(present, stationWeather, 0) * weights).sum(axis=1)
+            totalWeights = weights.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                weather[rows] = np.where(
+                    totalWeights > 0, totals / totalWeights, np.nan
+                )
+        return weather
@@ -22,7 +22,8 @@ from sklearn.metrics import (
 MODEL = "XGB"  # Model to test
 DATERANGE = ["2023-11-26", "2023-11-30"]  # Date range to train over
 PREDTIME = 1  # Prediction time for the model
-STATIONDISTANCE = 3.5  # Maximum Sensor-Station Distance Accepted
+NEIGHBOURS = 3  # Number of closest stations to interpolate weather from
+STATIONDISTANCE = None  # Maximum Sensor-Station Distance Accepted (optional)
 EPSILON = 1e-10  # Value of epsilon to use for MAPE calculations
 
 #! Print Settings
@@ -112,7 +113,10 @@ gridSearch = GridSearchCV(
 
 # Get data and preprocess it
 data = constructDataset(
-    predictionTime=PREDTIME, restrictDate=DATERANGE, restrictDistance=STATIONDISTANCE
+    predictionTime=PREDTIME,
+    restrictDate=DATERANGE,
+    restrictDistance=STATIONDISTANCE,
+    neighbours=NEIGHBOURS,
 )
 data = data.sample(frac=1).reset_index(drop=True)  # Shuffle data
 x = data.drop(
@@ -136,7 +140,12 @@ x = scaler.fit_transform(x)
 # Fit data to grid search
 gridSearch.fit(x, y)
 model = gridSearch.best_estimator_
-saveModel(model, f"{MODEL}-{PREDTIME}h-{STATIONDISTANCE}km.pkl")
+modelName = f"{MODEL}-{PREDTIME}h"
+if STATIONDISTANCE:
+    modelName += f"-{STATIONDISTANCE}km"
+if NEIGHBOURS:
+    modelName += f"-{NEIGHBOURS}n"
+saveModel(model, f"{modelName}.pkl")
 
 # Access best params
 log(Back.GREEN, "BEST PARAMETERS", "\n", start="\n")
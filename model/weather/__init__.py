@@ -1,7 +1,9 @@
 # Document for generation of data
 try:
     from .api import getWeatherRange
-    from .myutils import weatherAt
+    from .myutils import weatherAt, frameFingerprint, WEATHER_TYPES
+    from .store import WeatherStore
+    from .grid import WeatherGrid, GridPool
 except:
     from api import getWeatherRange
     from datetime import datetime
@@ -1,21 +1,63 @@
 # Functions for pulling data from government APIs
 try:
     from .myutils import (
-        normalizeWeather,
+        decodeWeather,
         normalizeStations,
+        WEATHER_TYPES,
     )
+    from .cache import ResponseCache, weatherCache
 except:
     from myutils import (
-        normalizeWeather,
+        decodeWeather,
         normalizeStations,
+        WEATHER_TYPES,
     )
+    from cache import ResponseCache, weatherCache
 from datetime import datetime
 from colorama import Fore, Back, Style
 from time import time
-import requests, pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests, numpy as np, pandas as pd
 
+# Base url of the NEA realtime weather API, type of reading is appended to it
+WEATHER_ENDPOINT = "https://api.data.gov.sg/v1/environment/"
 
-def getWeather(type: str, date: datetime) -> pd.DataFrame:
+
+def createSession(
+    poolSize: int = 10, retries: int = 3, backoff: float = 0.5
+) -> requests.Session:
+    """
+    Creates a keep-alive session for the weather API, retrying failed requests with exponential backoff.
+
+    Parameters
+    ----------
+    `poolSize`: Number of connections kept alive, should be at least the number of workers fetching\n
+    `retries`: Number of times a failed request is retried before raising an error\n
+    `backoff`: Backoff factor (in seconds) between retries, doubling on every retry
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(
+        pool_connections=poolSize, pool_maxsize=poolSize, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def getWeather(
+    type: str,
+    date: datetime,
+    session: requests.Session = None,
+    cache: ResponseCache = weatherCache,
+) -> pd.DataFrame:
     """
     Gets raw data using the NEA's realtime weather API for the given date, of a specific type.\n
 
@@ -29,39 +71,83 @@ def getWeather(type: str, date: datetime) -> pd.DataFrame:
     Parameters
     ----------
     `type`: Type of data to pull (air-temperature, relative-humidity, rainfall, wind-direction, wind-speed)\n
-    `endDate`: Date on which data should end, defaults to same date as startDate
+    `date`: Date to pull data for\n
+    `session`: Optional session to reuse connections with, a new connection is opened otherwise\n
+    `cache`: Cache of raw responses to check before fetching, pass None to always fetch
     """
-    # Log details
-    print(Fore.BLACK + Back.WHITE + "[GET]" + Style.RESET_ALL, f"{type}", end=": ")
     weatherTimer = time()
-    # Fetch data
-    endpoint = "https://api.data.gov.sg/v1/environment/" + type
-    params = {"date": date.strftime("%Y-%m-%d")}
-    response = requests.get(endpoint, params=params).json()
-
-    # Change keys for readings to match type of reading, adding units
-    timedReadings = response["items"]
-    for minute in range(len(timedReadings)):
-        for reading in timedReadings[minute]["readings"]:
-            if not "value" in reading:
-                reading["value"] = None
-            reading[type] = reading.pop("value")
-
-    # Merge required data
+    # Fetch data, unless a response has already been saved
+    response = cache.get(type, date) if cache else None
+    if response is None:
+        fetched = time()
+        endpoint = WEATHER_ENDPOINT + type
+        params = {"date": date.strftime("%Y-%m-%d")}
+        response = (session or requests).get(endpoint, params=params, timeout=60)
+        response = response.json()
+        if cache and "items" in response:
+            cache.put(type, date, response, fetched)
+
+    # Decode readings and merge required data
     stations = normalizeStations(response["metadata"]["stations"])
-    readings = normalizeWeather(timedReadings)
+    readings = decodeWeather(response, type)
     readings = readings.merge(right=stations, on="station-id", how="left")
     readings = readings[
         ["timestamp", "station-id", "station-name", "latitude", "longitude", type]
     ]
 
-    # Log and return data
-    print(f"{round(time()-weatherTimer,2)}s")
+    # Log (in a single print, so concurrent fetches do not interleave) and return data
+    print(
+        Fore.BLACK + Back.WHITE + "[GET]" + Style.RESET_ALL,
+        f"{type} ({date.strftime('%d/%m/%Y')}): {round(time()-weatherTimer,2)}s",
+    )
     return readings
 
 
+def mergeWeatherTypes(weatherData: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Merges the dataframes of each weather type for a single day into one dataframe,
+    aligning all types on (station-id, timestamp) in a single operation.
+    """
+    types = [typeDf.columns[-1] for typeDf in weatherData]
+    # Take station details from all types, as some stations do not report every type
+    stations = pd.concat(
+        [
+            typeDf[["station-id", "station-name", "latitude", "longitude"]]
+            for typeDf in weatherData
+        ]
+    ).drop_duplicates(subset="station-id")
+    stationIndex = pd.Index(stations["station-id"])
+    timeIndex = pd.Index(
+        pd.concat([typeDf["timestamp"] for typeDf in weatherData])
+    ).unique()
+
+    # Encode (station-id, timestamp) of every reading as one integer, and align all keys at once
+    keys = [
+        stationIndex.get_indexer(typeDf["station-id"]) * len(timeIndex)
+        + timeIndex.get_indexer(typeDf["timestamp"])
+        for typeDf in weatherData
+    ]
+    uniqueKeys, positions = np.unique(np.concatenate(keys), return_inverse=True)
+    dateDf = stations.iloc[uniqueKeys // len(timeIndex)].reset_index(drop=True)
+    dateDf.insert(0, "timestamp", timeIndex[uniqueKeys % len(timeIndex)])
+
+    # Place readings of each type at their keys (the first reading is kept for repeated keys)
+    start = 0
+    for type, typeDf in zip(types, weatherData):
+        typePositions = positions[start : start + typeDf.shape[0]]
+        values = np.full(len(uniqueKeys), np.nan)
+        values[typePositions[::-1]] = typeDf[type].to_numpy(dtype=np.float64)[::-1]
+        dateDf[type] = values
+        start += typeDf.shape[0]
+    return dateDf
+
+
 def getWeatherRange(
-    date: datetime, endDate: datetime = None, interval: int = 5
+    date: datetime,
+    endDate: datetime = None,
+    interval: int = 5,
+    workers: int = None,
+    cache: ResponseCache = weatherCache,
 ) -> pd.DataFrame:
     """
     Gets detailed weather data over a range of dates using the NEA's realtime weather API.
@@ -78,7 +164,9 @@ def getWeatherRange(
     ----------
     `date`: Date on which data should begin. To fetch data for a single date, do not pass in endDate\n
     `endDate`: Optional date on which data should end\n
-    `interval`: Interval in minutes between each reading. Mean of measurements within each interval is taken as measurement for that interval.
+    `interval`: Interval in minutes between each reading. Mean of measurements within each interval is taken as measurement for that interval.\n
+    `workers`: Number of requests made concurrently. Fetches one request at a time if not given\n
+    `cache`: Cache of raw responses to check before fetching, pass None to always fetch
     """
 
     # Log time
@@ -87,48 +175,58 @@ def getWeatherRange(
     if endDate == None:
         endDate = date
     dates = list(pd.date_range(date, endDate))
-    weatherDf = pd.DataFrame()
+    session = createSession(poolSize=max(workers or 1, 10))
 
-    # Get data over date range
-    for date in dates:
-        # Begin logging
-        dateTimer = time()
+    # Fetch all dates and types at once, keeping results in the same order as the serial fetch
+    if workers and workers > 1:
         print(
             Fore.BLACK + Back.GREEN + "[FETCH]" + Style.RESET_ALL,
-            f"Weather for {date.strftime('%d/%m/%Y')}",
+            f"Weather for {dates[0].strftime('%d/%m/%Y')} to {dates[-1].strftime('%d/%m/%Y')} ({workers} workers)",
         )
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                [
+                    executor.submit(getWeather, type, date, session, cache)
+                    for type in WEATHER_TYPES
+                ]
+                for date in dates
+            ]
+            dateDfs = [
+                mergeWeatherTypes([future.result() for future in dateFutures])
+                for dateFutures in futures
+            ]
 
-        # Get all weather/station data
-        weatherTypes = [
-            "rainfall",
-            "air-temperature",
-            "relative-humidity",
-            "wind-direction",
-            "wind-speed",
-        ]
-        weatherData = []
-        for type in weatherTypes:
-            weatherData.append(getWeather(type, date))
-
-        # Merge weather data for a particular day and add to weatherDf
-        dateDf = weatherData[0]
-        for i in range(1, len(weatherData)):
-            currentType = weatherData[i].columns.tolist()[-1]
-            dateDf = dateDf.merge(
-                weatherData[i][["timestamp", "station-id", currentType]],
-                how="outer",
-                on=["timestamp", "station-id"],
+    # Get data over date range
+    else:
+        dateDfs = []
+        for date in dates:
+            # Begin logging
+            dateTimer = time()
+            print(
+                Fore.BLACK + Back.GREEN + "[FETCH]" + Style.RESET_ALL,
+                f"Weather for {date.strftime('%d/%m/%Y')}",
             )
-        weatherDf = pd.concat(
-            [weatherDf, dateDf.reset_index(drop=True)], ignore_index=True
-        )
-        print(
-            Fore.BLACK
-            + Back.GREEN
-            + f"Completed in {round(time()-dateTimer, 2)}s"
-            + Style.RESET_ALL
-            + "\n"
-        )
+
+            # Get all weather/station data
+            weatherData = []
+            for type in WEATHER_TYPES:
+                weatherData.append(getWeather(type, date, session, cache))
+
+            # Merge weather data for a particular day, adding it to weatherDf once all days are fetched
+            dateDfs.append(mergeWeatherTypes(weatherData))
+            print(
+                Fore.BLACK
+                + Back.GREEN
+                + f"Completed in {round(time()-dateTimer, 2)}s"
+                + Style.RESET_ALL
+                + "\n"
+            )
+    session.close()
+    weatherDf = pd.concat(dateDfs, ignore_index=True)
+    if cache:
+        stats = cache.stats()
+        log = f"{stats['hits']} hits, {stats['misses']} misses, {round(stats['size']/1024**2, 2)}MB"
+        print(Fore.BLACK + Back.WHITE + "[CACHE]" + Style.RESET_ALL, log)
 
     # Clean and neaten data
     weatherDf = (
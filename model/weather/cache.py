@@ -0,0 +1,162 @@
+# Persistent cache for raw responses of the weather API
+import os, gzip, json, threading
+from datetime import datetime, date as dateType, timedelta, timezone
+from time import time
+import pandas as pd
+
+# Dates in the weather API are in Singapore time
+SGT = timezone(timedelta(hours=8))
+
+
+class ResponseCache:
+    """
+    Compressed on-disk cache of raw weather API responses, keyed by (type, date).\n
+    Each response is saved with the time it was fetched. Responses fetched after their day ended are never refetched,
+    while responses fetched during their day (which may be missing later readings) expire after a TTL.
+    Least recently used responses are evicted once the cache grows beyond its maximum size.
+
+    Parameters
+    ----------
+    `path`: Directory in which responses are saved\n
+    `maxSize`: Maximum size (in bytes) of all saved responses\n
+    `ttl`: Time (in seconds) for which a response for the current day is valid
+    """
+
+    def __init__(self, path: str, maxSize: int = 500 * 1024**2, ttl: int = 15 * 60):
+        self.path = os.path.abspath(path)
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+        # Time each response was last used, files not used yet fall back to their fetch time
+        self._used = {}
+
+    def _filePath(self, type: str, date: dateType) -> str:
+        date = pd.Timestamp(date).date()
+        return os.path.join(self.path, type, f"{date.strftime('%Y-%m-%d')}.json.gz")
+
+    def _files(self) -> list[str]:
+        if not os.path.isdir(self.path):
+            return []
+        return [
+            os.path.join(root, file)
+            for root, _, files in os.walk(self.path)
+            for file in files
+            if file.endswith(".json.gz")
+        ]
+
+    @property
+    def size(self) -> int:
+        """Total size (in bytes) of all saved responses."""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(os.path.getsize(file) for file in self._files())
+            return self._size
+
+    def isValid(self, fetched: float, date: dateType) -> bool:
+        """
+        Checks if a response fetched at a time (in seconds since the epoch) is still valid.
+        Responses fetched after the end of their day in Singapore are always valid, others only within the TTL.
+        """
+        dayEnd = datetime.combine(date + timedelta(days=1), datetime.min.time(), SGT)
+        if fetched >= dayEnd.timestamp():
+            return True
+        return time() - fetched < self.ttl
+
+    def get(self, type: str, date: dateType) -> dict:
+        """
+        Gets a saved response, returning None if it is not saved or has expired.
+        """
+        # Dates may be given as datetimes or timestamps
+        date = pd.Timestamp(date).date()
+        filePath = self._filePath(type, date)
+        try:
+            with gzip.open(filePath, "rb") as file:
+                saved = json.loads(file.read())
+            if self.isValid(saved["fetched"], date):
+                with self._lock:
+                    self._used[filePath] = time()
+                    self.hits += 1
+                return saved["response"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, type: str, date: dateType, response: dict, fetched: float = None):
+        """
+        Saves a response, evicting least recently used responses if the cache is full.
+
+        Parameters
+        ----------
+        `type`: Type of weather data in the response\n
+        `date`: Date the response holds readings for\n
+        `response`: Raw response of the weather API\n
+        `fetched`: Time (in seconds since the epoch) the request was sent, defaults to now
+        """
+        self.size  # Make sure existing responses have been counted
+        date = pd.Timestamp(date).date()
+        filePath = self._filePath(type, date)
+        saved = {
+            "fetched": time() if fetched is None else fetched,
+            "response": response,
+        }
+        os.makedirs(os.path.dirname(filePath), exist_ok=True)
+        # Write to a temporary file first so that readers never see partial files
+        tempPath = f"{filePath}.{threading.get_ident()}.tmp"
+        with gzip.open(tempPath, "wb", compresslevel=6) as file:
+            file.write(json.dumps(saved, separators=(",", ":")).encode("utf-8"))
+        newSize = os.path.getsize(tempPath)
+        oldSize = os.path.getsize(filePath) if os.path.isfile(filePath) else 0
+        os.replace(tempPath, filePath)
+
+        with self._lock:
+            self._size += newSize - oldSize
+            self._used[filePath] = time()
+        if self._size > self.maxSize:
+            self.evict()
+
+    def evict(self):
+        """
+        Deletes least recently used responses until the cache is within its maximum size.
+        """
+        with self._lock:
+            files = sorted(
+                self._files(),
+                key=lambda file: self._used.get(file) or os.path.getmtime(file),
+            )
+            for file in files:
+                if self._size <= self.maxSize:
+                    break
+                fileSize = os.path.getsize(file)
+                os.remove(file)
+                self._used.pop(file, None)
+                self._size -= fileSize
+                self.evictions += 1
+
+    def clear(self):
+        """Deletes all saved responses and resets counters."""
+        with self._lock:
+            for file in self._files():
+                os.remove(file)
+            self._used.clear()
+            self._size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Returns hit/miss/eviction counts and the size of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": self.size,
+            "maxSize": self.maxSize,
+        }
+
+
+# Cache used by default when fetching weather
+weatherCache = ResponseCache(os.path.join(__file__, "../../data/cache/weather"))
@@ -0,0 +1,264 @@
+# Dense grid of weather data, for answering weather queries over windows of time in constant time
+import os, json, tempfile, numpy as np, pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .myutils import WEATHER_TYPES
+except:
+    from myutils import WEATHER_TYPES
+
+MINUTE = 60 * 10**9  # Nanoseconds in a minute
+RAINFALL = WEATHER_TYPES.index("rainfall")
+CHUNKSIZE = 50_000  # Pairs queried at once, bounding intermediate arrays
+
+
+class WeatherGrid:
+    """
+    Weather data laid out as a (station x time) grid, holding running totals of readings
+    so that the weather over any window of time is found with a constant number of lookups.\n
+    Queries give the same results as weatherAt: rainfall is summed and other types are averaged over the window,
+    with all values missing if the station has no readings in the window.
+
+    NOTE: Weather timestamps should fall on whole minutes. Create grids using WeatherGrid.fromFrame
+    """
+
+    def __init__(
+        self,
+        stations: pd.Index,
+        origin: int,
+        step: int,
+        sums: np.ndarray,
+        counts: np.ndarray,
+        rows: np.ndarray,
+    ):
+        self.stations = stations
+        self.origin = origin
+        self.step = step
+        self.sums = sums
+        self.counts = counts
+        self.rows = rows
+
+    @classmethod
+    def fromFrame(cls, weatherDf: pd.DataFrame) -> "WeatherGrid":
+        """
+        Creates a grid from weather data (as returned by getAllData).
+        """
+        # Index readings of known stations, rather than copying weatherDf without the rest
+        known = weatherDf["station-id"].notna().to_numpy()
+        timestamps = pd.to_datetime(weatherDf["timestamp"])
+        if timestamps.dt.tz is not None:
+            timestamps = timestamps.dt.tz_localize(None)
+        timestamps = timestamps.to_numpy("datetime64[ns]").view(np.int64)[known]
+        # Stations encoded with the id registry are laid out by their codes, so ids of the same type need no lookup
+        stationIds = weatherDf["station-id"]
+        if isinstance(stationIds.dtype, pd.CategoricalDtype):
+            stationCodes = stationIds.cat.codes.to_numpy()
+            stations = stationIds.cat.categories
+        else:
+            stationCodes, stations = pd.factorize(stationIds, sort=True)
+            stations = pd.Index(stations)
+        stationCodes = stationCodes[known].astype(np.int64)
+
+        # Space time slots by the largest step that still places every reading on its own slot
+        origin = int(timestamps.min()) if len(timestamps) else 0
+        step = int(np.gcd.reduce(timestamps - origin)) if len(timestamps) else MINUTE
+        step = step or MINUTE
+        if step % MINUTE or origin % MINUTE:
+            raise ValueError("Weather timestamps should fall on whole minutes")
+        numSlots = (
+            (int(timestamps.max()) - origin) // step + 1 if len(timestamps) else 1
+        )
+
+        # Total up readings in each (station, slot), shifted by one slot to start the running totals at 0
+        cells = stationCodes * (numSlots + 1) + (timestamps - origin) // step + 1
+        del timestamps, stationCodes
+        shape = (len(stations), numSlots + 1)
+        size = shape[0] * shape[1]
+        # Running totals are built one type at a time in place, so only one type's totals are ever held twice
+        sums = np.empty((*shape, len(WEATHER_TYPES)))
+        counts = np.empty((*shape, len(WEATHER_TYPES)), dtype=np.int32)
+        for i, type in enumerate(WEATHER_TYPES):
+            values = weatherDf[type].to_numpy(dtype=np.float64)[known]
+            present = ~np.isnan(values)
+            totals = np.bincount(
+                cells[present], weights=values[present], minlength=size
+            )
+            np.cumsum(totals.reshape(shape), axis=1, out=sums[..., i])
+            totals = np.bincount(cells[present], minlength=size)
+            np.cumsum(totals.reshape(shape), axis=1, out=counts[..., i])
+        rows = np.cumsum(
+            np.bincount(cells, minlength=size).reshape(shape), axis=1, dtype=np.int32
+        )
+        return cls(stations, origin, step, sums, counts, rows)
+
+    def query(
+        self, stationIds, times, interval, chunkSize: int = CHUNKSIZE, dtype=np.float64
+    ) -> np.ndarray:
+        """
+        Calculates weather at many (station, time) pairs at once, returning a matrix with one row per pair
+        and one column per weather type (in the order of WEATHER_TYPES).
+
+        Parameters
+        ----------
+        `stationIds`: Array of station ids\n
+        `times`: Array of times, at the center of each window\n
+        `interval`: Length of each window in minutes, either one length or one per pair. Should be even\n
+        `chunkSize`: Number of pairs calculated at a time\n
+        `dtype`: Type of the matrix returned (weather is always calculated in float64)
+        """
+        codes = self.codes(stationIds)
+        times = (
+            pd.to_datetime(np.asarray(times)).to_numpy("datetime64[ns]").view(np.int64)
+        )
+        interval = np.broadcast_to(np.asarray(interval), codes.shape)
+        weather = np.empty((len(codes), len(WEATHER_TYPES)), dtype=dtype)
+        for start in range(0, len(codes), chunkSize):
+            chunk = slice(start, start + chunkSize)
+            weather[chunk] = self.queryCodes(
+                codes[chunk], times[chunk], interval[chunk]
+            )
+        return weather
+
+    def codes(self, stationIds) -> np.ndarray:
+        """
+        Gets the position of each station id in the grid (-1 if unknown). Categorical ids are looked up once per category,
+        and ids of the grid's categorical type (from the id registry) are positioned by their codes.
+        """
+        if isinstance(stationIds, (pd.Series, pd.Index)):
+            stationIds = stationIds.array
+        if isinstance(stationIds, pd.Categorical):
+            categories = stationIds.categories
+            if categories.equals(self.stations[: len(categories)]):
+                return stationIds.codes
+            positions = np.append(self.stations.get_indexer(categories), -1)
+            return positions.astype(np.int32)[stationIds.codes]
+        return self.stations.get_indexer(np.asarray(stationIds))
+
+    def queryCodes(self, codes: np.ndarray, times: np.ndarray, interval) -> np.ndarray:
+        """
+        Same as query, taking positions of stations in the grid (-1 if unknown) and times as int64 nanoseconds.
+        """
+        interval = np.asarray(interval, dtype=np.int64)
+
+        # Find first and last slot of each window, as positions in the running totals
+        start = times - (interval // 2) * MINUTE
+        end = start + interval * MINUTE
+        first = np.clip(
+            -((self.origin - start) // self.step), 0, self.rows.shape[1] - 1
+        )
+        last = np.clip((end - self.origin) // self.step + 1, 0, self.rows.shape[1] - 1)
+
+        # Windows of unknown stations or times off whole minutes hold no readings
+        valid = (codes >= 0) & (times % MINUTE == 0) & (last > first)
+        codes = np.where(valid, codes, 0)
+        last = np.where(valid, last, first)
+
+        # Take differences of running totals over each window (in place, to keep chunks' intermediate arrays few)
+        rows = self.rows[codes, last]
+        rows -= self.rows[codes, first]
+        weather = self.sums[codes, last]
+        weather -= self.sums[codes, first]
+        counts = self.counts[codes, last]
+        counts -= self.counts[codes, first]
+
+        # Average readings over each window, except rainfall which is totalled
+        rainfall = weather[:, RAINFALL].copy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            np.divide(weather, counts, out=weather)
+        weather[counts == 0] = np.nan
+        weather[:, RAINFALL] = rainfall
+        weather[rows == 0] = np.nan
+        return weather
+
+    def save(self, path: str):
+        """
+        Saves the grid to a directory, as numpy arrays that can be memory mapped by other processes.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ["sums", "counts", "rows"]:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "grid.json"), "w") as file:
+            details = {"stations": self.stations.tolist(), "origin": self.origin}
+            json.dump({**details, "step": self.step}, file)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "WeatherGrid":
+        """
+        Loads a grid saved to a directory. Arrays are memory mapped (read only) unless mmap is False.
+        """
+        with open(os.path.join(path, "grid.json")) as file:
+            details = json.load(file)
+        arrays = [
+            np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in ["sums", "counts", "rows"]
+        ]
+        return cls(
+            pd.Index(details["stations"]), details["origin"], details["step"], *arrays
+        )
+
+
+# Grid used by each worker process of a GridPool
+workerGrid = None
+
+
+def loadWorkerGrid(path: str):
+    global workerGrid
+    workerGrid = WeatherGrid.load(path)
+
+
+def queryWorkerGrid(codes, times, interval) -> np.ndarray:
+    return workerGrid.queryCodes(codes, times, interval)
+
+
+class GridPool:
+    """
+    Pool of processes answering grid queries in parallel. The grid is saved once to a temporary
+    directory and memory mapped by every process, rather than being copied into each process.\n
+    Use as a context manager, to make sure processes and saved files are cleaned up.
+
+    Parameters
+    ----------
+    `grid`: Grid to query\n
+    `workers`: Number of processes to use
+    """
+
+    def __init__(self, grid: WeatherGrid, workers: int):
+        self.grid = grid
+        self.workers = workers
+
+    def __enter__(self) -> "GridPool":
+        self.directory = tempfile.TemporaryDirectory(prefix="weathergrid-")
+        self.grid.save(self.directory.name)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=loadWorkerGrid,
+            initargs=(self.directory.name,),
+        )
+        return self
+
+    def __exit__(self, *args):
+        self.executor.shutdown()
+        self.directory.cleanup()
+
+    def query(self, stationIds, times, interval, dtype=np.float64) -> np.ndarray:
+        """
+        Same as WeatherGrid.query, with pairs split evenly across processes.
+        """
+        # Send stations and times to processes as integers, which are cheap to copy
+        codes = self.grid.codes(stationIds)
+        times = (
+            pd.to_datetime(np.asarray(times)).to_numpy("datetime64[ns]").view(np.int64)
+        )
+        interval = np.broadcast_to(np.asarray(interval), codes.shape)
+        chunks = np.array_split(np.arange(len(codes)), self.workers)
+        futures = [
+            self.executor.submit(
+                queryWorkerGrid, codes[chunk], times[chunk], interval[chunk]
+            )
+            for chunk in chunks
+            if len(chunk)
+        ]
+        results = [future.result() for future in futures]
+        if not results:
+            return np.empty((0, len(WEATHER_TYPES)), dtype=dtype)
+        return np.concatenate(results, dtype=dtype)
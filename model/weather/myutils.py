@@ -1,7 +1,17 @@
 # Module for convenience functions
-import pandas as pd
+import hashlib, weakref, numpy as np, pandas as pd
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
+# Types of weather measured, in the order their columns appear in weather data
+WEATHER_TYPES = [
+    "rainfall",
+    "air-temperature",
+    "relative-humidity",
+    "wind-direction",
+    "wind-speed",
+]
+
 
 def normalizeWeather(data: dict) -> pd.DataFrame:
     """
@@ -18,6 +28,37 @@ def normalizeWeather(data: dict) -> pd.DataFrame:
     return df.reset_index(drop=True)
 
 
+def decodeWeather(response: dict, type: str) -> pd.DataFrame:
+    """
+    Decodes a raw weather API response into a dataframe of timestamps, station ids and readings (named after the type).\n
+    Builds each column as an array directly from the response, without modifying the response.
+    """
+    items = response["items"]
+    readings = [reading for item in items for reading in item["readings"]]
+    counts = [len(item["readings"]) for item in items]
+
+    # Parse each distinct timestamp once, repeating it for all readings taken at that time
+    times = pd.to_datetime(
+        [item["timestamp"] for item in items], format="%Y-%m-%dT%H:%M:%S%z"
+    )
+    timestamps = np.repeat(times.asi8, counts)
+    stationIds = np.array([reading["station_id"] for reading in readings], dtype=object)
+    values = np.array([reading.get("value") for reading in readings], dtype=np.float64)
+
+    # Sort by timestamp, then station id
+    stationCodes, _ = pd.factorize(stationIds, sort=True)
+    order = np.lexsort((stationCodes, timestamps))
+    return pd.DataFrame(
+        {
+            "timestamp": pd.DatetimeIndex(timestamps[order], tz="UTC").tz_convert(
+                times.tz
+            ),
+            "station-id": stationIds[order],
+            type: values[order],
+        }
+    )
+
+
 def normalizeStations(data: dict) -> pd.DataFrame:
     """
     Normalizes and cleans station data (in dictionary format), converting it to a flattened dataframe.
@@ -49,8 +90,89 @@ def concatStations(data: list[pd.DataFrame]) -> pd.DataFrame:
     return df.reset_index(drop=True)
 
 
-# Expensive function, need to memoize details
-memo = {}
+class LRUCache:
+    """
+    Cache holding at most maxSize entries, evicting the least recently used entry when full.\n
+    Counts hits, misses and evictions, which can be checked with stats().
+    """
+
+    def __init__(self, maxSize: int = 100_000):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Gets an entry, marking it as recently used. Returns default if not present."""
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """Adds an entry, evicting least recently used entries if the cache is full."""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Removes all entries and resets counters."""
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Returns hit/miss/eviction counts and the number of entries held."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "maxSize": self.maxSize,
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# Fingerprints of dataframes, kept until the dataframe is garbage collected
+fingerprints = {}
+
+
+def frameFingerprint(df: pd.DataFrame) -> str:
+    """
+    Hashes the contents (columns and values) of a dataframe. The hash is only calculated once per dataframe object.
+
+    NOTE: Modifying a dataframe in place after it has been fingerprinted does not update its fingerprint
+    """
+    if id(df) in fingerprints:
+        return fingerprints[id(df)]
+    hasher = hashlib.sha1(str(list(df.columns)).encode("utf-8"))
+    hasher.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    fingerprint = hasher.hexdigest()
+    fingerprints[id(df)] = fingerprint
+    weakref.finalize(df, fingerprints.pop, id(df), None)
+    return fingerprint
+
+
+def stationMask(stationIds: pd.Series, stationId) -> np.ndarray:
+    """
+    Returns a mask of the rows of stationIds equal to stationId, comparing integer codes if stationIds is categorical.
+    """
+    if isinstance(stationIds.dtype, pd.CategoricalDtype):
+        categories = stationIds.cat.categories
+        if stationId not in categories:
+            return np.zeros(len(stationIds), dtype=bool)
+        return stationIds.cat.codes.to_numpy() == categories.get_loc(stationId)
+    return (stationIds == stationId).to_numpy()
+
+
+# Expensive function, need to memoize details (keyed by the weatherDf queried)
+memo = LRUCache(maxSize=200_000)
 
 
 def weatherAt(
@@ -64,24 +186,23 @@ def weatherAt(
     """
 
     # Check for memoized results
-    key = (dt, interval, stationId)
-    if key in memo:
-        return memo[key]
+    key = (frameFingerprint(weatherDf), dt, interval, stationId)
+    memoized = memo.get(key)
+    if memoized is not None:
+        return memoized
 
     # Create list of minutes to check and filter weatherDf
     readingTimes = [
         dt + (i - interval // 2) * timedelta(minutes=1) for i in range(interval + 1)
     ]
-    reading = weatherDf[
-        (weatherDf["timestamp"].isin(readingTimes))
-        & (weatherDf["station-id"] == stationId)
-    ]
+    atStation = stationMask(weatherDf["station-id"], stationId)
+    reading = weatherDf[(weatherDf["timestamp"].isin(readingTimes)) & atStation]
 
     # Group readings in the interval together
     try:
         station = reading.iloc[0, :5].squeeze()
     except:
-        nullSeries = weatherDf[weatherDf["station-id"] == stationId].head(1)
+        nullSeries = weatherDf[atStation].head(1)
         nullSeries.iloc[:, -5:] = None
         return nullSeries.squeeze()
 
@@ -98,5 +219,5 @@ def weatherAt(
     ).squeeze()
     # Append in station data and memoize
     reading = pd.concat([station, reading])
-    memo[key] = reading
+    memo.put(key, reading)
     return reading
@@ -0,0 +1,110 @@
+# Date partitioned parquet store for weather data
+import os, uuid, pandas as pd
+import pyarrow as pa, pyarrow.dataset as ds, pyarrow.parquet as pq
+from datetime import date as dateType
+
+try:
+    from .myutils import WEATHER_TYPES
+except:
+    from myutils import WEATHER_TYPES
+
+TIMEZONE = "Asia/Singapore"
+SCHEMA = pa.schema(
+    [
+        ("station-id", pa.dictionary(pa.int32(), pa.string())),
+        ("station-name", pa.dictionary(pa.int32(), pa.string())),
+        ("timestamp", pa.timestamp("ns", tz=TIMEZONE)),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        *[(column, pa.float32()) for column in WEATHER_TYPES],
+    ]
+)
+
+
+class WeatherStore:
+    """
+    Stores weather data (in the format returned by getWeatherRange) as parquet files, with one folder per date.\n
+    Writes only ever add files to the folders of the dates written, and reads only open the folders of the dates requested.
+
+    Parameters
+    ----------
+    `path`: Directory in which the store is kept
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+
+    def _partitionPath(self, date: dateType) -> str:
+        return os.path.join(self.path, f"date={date.strftime('%Y-%m-%d')}")
+
+    def dates(self) -> set[dateType]:
+        """Returns all dates which have data in the store."""
+        if not os.path.isdir(self.path):
+            return set()
+        return {
+            dateType.fromisoformat(folder[5:])
+            for folder in os.listdir(self.path)
+            if folder.startswith("date=")
+        }
+
+    @staticmethod
+    def normalize(weatherDf: pd.DataFrame) -> pd.DataFrame:
+        """
+        Converts weather data to the types used by the store.
+        """
+        weatherDf = weatherDf[SCHEMA.names].copy()
+        timestamps = pd.to_datetime(weatherDf["timestamp"])
+        if timestamps.dt.tz is None:
+            weatherDf["timestamp"] = timestamps.dt.tz_localize(TIMEZONE)
+        else:
+            weatherDf["timestamp"] = timestamps.dt.tz_convert(TIMEZONE)
+        weatherDf["station-id"] = weatherDf["station-id"].astype("category")
+        weatherDf["station-name"] = weatherDf["station-name"].astype("category")
+        weatherDf[WEATHER_TYPES] = weatherDf[WEATHER_TYPES].astype("float32")
+        return weatherDf
+
+    def write(self, weatherDf: pd.DataFrame, replace: bool = False):
+        """
+        Appends weather data to the store, adding one file to the folder of each date present.
+        If replace is set, files already in those folders are removed, so whole days fetched again are not duplicated.
+        """
+        weatherDf = self.normalize(weatherDf)
+        for date, dateDf in weatherDf.groupby(weatherDf["timestamp"].dt.date):
+            partitionPath = self._partitionPath(date)
+            os.makedirs(partitionPath, exist_ok=True)
+            if replace:
+                for file in os.listdir(partitionPath):
+                    if file.endswith(".parquet"):
+                        os.remove(os.path.join(partitionPath, file))
+            table = pa.Table.from_pandas(dateDf, schema=SCHEMA, preserve_index=False)
+            pq.write_table(
+                table, os.path.join(partitionPath, f"part-{uuid.uuid4().hex}.parquet")
+            )
+
+    def read(
+        self, startDate: dateType, endDate: dateType, stations: list[str] = None
+    ) -> pd.DataFrame:
+        """
+        Reads weather data between two dates (inclusive), optionally only for some stations.
+        """
+        storedDates = self.dates()
+        partitions = [
+            self._partitionPath(date.date())
+            for date in pd.date_range(startDate, endDate)
+            if date.date() in storedDates
+        ]
+        files = [
+            os.path.join(partition, file)
+            for partition in partitions
+            for file in os.listdir(partition)
+            if file.endswith(".parquet")
+        ]
+        if not files:
+            return SCHEMA.empty_table().to_pandas()
+
+        dataset = ds.dataset(files, schema=SCHEMA, format="parquet")
+        filter = ds.field("station-id").isin(stations) if stations else None
+        weatherDf = dataset.to_table(filter=filter).to_pandas()
+        return weatherDf.sort_values(by=["station-id", "timestamp"]).reset_index(
+            drop=True
+        )